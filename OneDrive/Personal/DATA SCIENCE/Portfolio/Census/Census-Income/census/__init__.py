@@ -0,0 +1,11 @@
+"""Reusable building blocks for the Census-Income (KDD) analysis.
+
+The notebook and ``Census-Income.py`` walk through the analysis cell by cell;
+this package holds the parts that are worth sharing between runs.
+"""
+
+from census.cleaning import CensusCleaner, clean, clean_file, replace_sentinels
+from census.data import read_census, read_store
+from census.dedup import FingerprintSet, drop_duplicates, overlap_report
+from census.encoding import OneHotEncoder
+from census.schema import COLUMNS, DROP_COLUMNS, DTYPES, PARSE_DROP_COLUMNS, TARGET
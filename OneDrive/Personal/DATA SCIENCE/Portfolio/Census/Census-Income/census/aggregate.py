@@ -0,0 +1,161 @@
+"""Aggregate cube that serves the EDA bar and count plots.
+
+The EDA plots only ever need, for each value of a column, how many rows
+there are and how many of them have ``Income>50k``, optionally split by
+``Year``. ``build_cube`` computes those counts for every categorical column
+with one ``bincount`` per column over the integer codes. The plotting
+helpers in ``census.plots`` then render from this small table instead of
+rescanning the full frame for every chart.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from census.schema import TARGET
+
+CUBE_COLUMNS = ['column', 'value', 'by', 'count', 'positives']
+
+#``by`` label of every row when the frame has no ``by`` column
+ALL = 'All'
+
+
+def _codes(s):
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy(), s.cat.categories
+    return pd.factorize(s, sort=True)
+
+
+def cube_columns(df, max_levels=64, target=TARGET):
+    """Return the columns worth aggregating: categoricals and low-cardinality integers."""
+    columns = []
+    for col in df.columns:
+        if col == target:
+            continue
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype) or s.dtype == object:
+            columns.append(col)
+        elif pd.api.types.is_integer_dtype(s.dtype) and s.nunique() <= max_levels:
+            columns.append(col)
+    return columns
+
+
+def bin_numeric(df, columns=None, bins=10, target=TARGET):
+    """Return ``df`` with numeric columns cut into ``bins`` equal-width intervals.
+
+    The binned columns are ordered categoricals, so they feed ``build_cube``
+    and the rate/count plots like any other categorical column.
+    """
+    df = df.copy()
+    if columns is None:
+        columns = [c for c in df.columns if c != target and pd.api.types.is_numeric_dtype(df[c].dtype)
+                   and not isinstance(df[c].dtype, pd.CategoricalDtype)]
+    for col in columns:
+        if df[col].nunique() > bins:
+            df[col] = pd.cut(df[col], bins=bins)
+    return df
+
+
+def build_cube(df, columns=None, target=TARGET, by='Year'):
+    """Count rows and positives per (column value, ``by`` value) for many columns.
+
+    Returns a long frame with one row per column, value and ``by`` value,
+    holding ``count`` and ``positives`` (rows with ``target`` equal to 1).
+    When the frame has no ``by`` column (the cleaned frame drops ``Year``)
+    every row gets the single ``by`` label ``ALL``. Missing values are left
+    out, as seaborn does.
+    """
+    columns = cube_columns(df, target=target) if columns is None else columns
+    y = df[target].to_numpy().astype(np.float64)
+    if by is not None and by in df:
+        by_codes, by_values = _codes(df[by])
+    else:
+        by_codes, by_values = np.zeros(len(df), dtype=np.int64), pd.Index([ALL])
+    k = len(by_values)
+    parts = []
+    for col in columns:
+        if col == by:
+            continue
+        codes, values = _codes(df[col])
+        valid = (codes >= 0) & (by_codes >= 0)
+        idx = codes[valid].astype(np.int64) * k + by_codes[valid]
+        size = len(values) * k
+        counts = np.bincount(idx, minlength=size)
+        positives = np.bincount(idx, weights=y[valid], minlength=size)
+        parts.append(pd.DataFrame({
+            'column': col,
+            'value': np.repeat(np.asarray(values, dtype=object), k),
+            'by': np.tile(np.asarray(by_values, dtype=object), len(values)),
+            'count': counts,
+            'positives': positives.astype(np.int64),
+        }))
+    if not parts:
+        return pd.DataFrame(columns=CUBE_COLUMNS)
+    cube = pd.concat(parts, ignore_index=True)
+    return cube[cube['count'] > 0].reset_index(drop=True)
+
+
+CI_METHODS = ['wilson', 'agresti-coull', 'normal', 'bootstrap']
+
+
+def proportion_ci(positives, counts, level=0.95, method='wilson', n_boot=1000, random_state=None):
+    """Confidence interval for a binomial proportion, computed from counts.
+
+    ``method`` is one of:
+
+    - 'wilson': Wilson score interval, the default. Well behaved for the
+      small rates and small groups found in this data.
+    - 'agresti-coull': the "add z^2/2 successes and failures" interval.
+    - 'normal': the plain normal approximation.
+    - 'bootstrap': percentile interval over ``n_boot`` resamples. Resampling
+      n rows of a 0/1 column with replacement draws the positive count from
+      Binomial(n, p), so this matches seaborn's bootstrap without touching
+      the rows. Opt-in, as it is the slowest.
+
+    Returns the lower and upper bounds as arrays.
+    """
+    positives = np.asarray(positives, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.float64)
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = positives / counts
+        if method == 'wilson':
+            center = (p + z * z / (2 * counts)) / (1 + z * z / counts)
+            half = z / (1 + z * z / counts) * np.sqrt(p * (1 - p) / counts + z * z / (4 * counts * counts))
+        elif method == 'agresti-coull':
+            n = counts + z * z
+            center = (positives + z * z / 2) / n
+            half = z * np.sqrt(center * (1 - center) / n)
+        elif method == 'normal':
+            center = p
+            half = z * np.sqrt(p * (1 - p) / counts)
+        elif method == 'bootstrap':
+            rng = np.random.default_rng(random_state)
+            n = counts.astype(np.int64)
+            draws = rng.binomial(n[:, None], np.nan_to_num(p)[:, None], size=(len(n), n_boot))
+            draws = draws / np.maximum(n, 1)[:, None]
+            tail = (1 - level) / 2 * 100
+            low, high = np.percentile(draws, [tail, 100 - tail], axis=1)
+            empty = counts == 0
+            low[empty], high[empty] = np.nan, np.nan
+            return low, high
+        else:
+            raise ValueError('Unknown method {!r}, expected one of {}'.format(method, CI_METHODS))
+    return np.clip(center - half, 0, 1), np.clip(center + half, 0, 1)
+
+
+def rates(cube, column, by=True, level=0.95, method='wilson', **kwargs):
+    """Return count, positives, ``Income>50k`` rate and its interval per value of ``column``.
+
+    With ``by=False`` the ``by`` split is summed away first. ``method`` and
+    any extra keyword arguments are passed to ``proportion_ci``.
+    """
+    sub = cube[cube['column'] == column]
+    if sub.empty:
+        raise ValueError('Column {!r} is not in the cube'.format(column))
+    keys = ['value', 'by'] if by else ['value']
+    sub = sub.groupby(keys, sort=False)[['count', 'positives']].sum().reset_index()
+    sub['rate'] = sub['positives'] / sub['count']
+    sub['ci_low'], sub['ci_high'] = proportion_ci(sub['positives'], sub['count'], level, method, **kwargs)
+    return sub
@@ -0,0 +1,110 @@
+"""Association between categorical columns: Cramér's V and mutual information.
+
+``df.corr()`` ignores the categoricals, which is where most of the drop
+decisions of the EDA were made. Every column is reduced to integer codes
+(numeric columns with many values are cut into quantile bins), and each
+pairwise contingency table is a single ``bincount`` over the combined codes.
+``drop_checks`` turns the resulting matrices into the checks behind those
+decisions: columns only weakly associated with ``Income>50k``, and columns
+that are nearly determined by a more informative one.
+"""
+
+import numpy as np
+import pandas as pd
+
+from census.schema import TARGET
+
+
+def encode(s, bins=10, max_levels=64):
+    """Integer codes for ``s``, with missing values as their own last level.
+
+    Returns the codes and the number of levels.
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy().astype(np.int64)
+    elif pd.api.types.is_numeric_dtype(s.dtype) and s.nunique() > max_levels:
+        codes = pd.qcut(s, bins, labels=False, duplicates='drop')
+        codes = np.where(codes.isna(), -1, codes).astype(np.int64)
+    else:
+        codes = pd.factorize(s)[0].astype(np.int64)
+    levels = int(codes.max()) + 1 if len(codes) else 0
+    if (codes < 0).any():
+        codes = np.where(codes < 0, levels, codes)
+        levels += 1
+    return codes, levels
+
+
+def contingency(a, ka, b, kb):
+    """Contingency table of two code arrays, with empty rows and columns removed."""
+    table = np.bincount(a * kb + b, minlength=ka * kb).reshape(ka, kb)
+    return table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+
+
+def cramers_v(table):
+    n = table.sum()
+    r, c = table.shape
+    if n == 0 or min(r, c) < 2:
+        return 0.0
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / n
+    chi2 = ((table - expected) ** 2 / expected).sum()
+    return float(np.sqrt(chi2 / n / (min(r, c) - 1)))
+
+
+def mutual_info(table):
+    """Mutual information in nats."""
+    n = table.sum()
+    if n == 0:
+        return 0.0
+    p = table / n
+    outer = np.outer(p.sum(axis=1), p.sum(axis=0))
+    nz = p > 0
+    return float((p[nz] * np.log(p[nz] / outer[nz])).sum())
+
+
+def association(df, columns=None, bins=10):
+    """Pairwise Cramér's V and mutual information for ``columns`` of ``df``.
+
+    Returns two symmetric frames, ``(cramers_v, mutual_info)``. The diagonal
+    of the mutual information holds each column's entropy.
+    """
+    columns = list(df.columns) if columns is None else list(columns)
+    encoded = [encode(df[c], bins) for c in columns]
+    d = len(columns)
+    v = np.eye(d)
+    mi = np.zeros((d, d))
+    for i in range(d):
+        a, ka = encoded[i]
+        for j in range(i, d):
+            b, kb = encoded[j]
+            table = contingency(a, ka, b, kb)
+            mi[i, j] = mi[j, i] = mutual_info(table)
+            if i != j:
+                v[i, j] = v[j, i] = cramers_v(table)
+    return pd.DataFrame(v, index=columns, columns=columns), pd.DataFrame(mi, index=columns, columns=columns)
+
+
+def drop_checks(v, mi, target=TARGET, weak=0.05, redundant=0.8):
+    """Flag columns that are candidates for dropping.
+
+    A column is 'weak' when its Cramér's V with ``target`` is below ``weak``,
+    and 'redundant' when its V with another column is at least ``redundant``
+    and that other column carries more information about ``target``.
+    Returns one row per column, sorted by mutual information with ``target``.
+    """
+    rows = {}
+    for col in v.columns:
+        if col == target:
+            continue
+        others = v.loc[col].drop([col, target])
+        partner = others.idxmax() if len(others) else None
+        partner_v = others.max() if len(others) else 0.0
+        rows[col] = {
+            'mi_target': mi.loc[col, target],
+            'v_target': v.loc[col, target],
+            'closest': partner,
+            'v_closest': partner_v,
+            'weak': v.loc[col, target] < weak,
+            'redundant': bool(partner is not None and partner_v >= redundant
+                              and mi.loc[partner, target] > mi.loc[col, target]),
+        }
+    return pd.DataFrame.from_dict(rows, orient='index').sort_values('mi_target', ascending=False)
@@ -0,0 +1,40 @@
+"""Helpers that rewrite categorical columns through their dictionaries.
+
+A categorical column stores each distinct value once, so transforms applied
+to the categories cost one call per distinct value instead of one per row.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def remap(s, values):
+    """Replace each category of ``s`` with the matching entry of ``values``.
+
+    ``values`` is aligned with ``s.cat.categories``. Entries that are null
+    turn the affected rows into missing values, and categories that map to
+    the same value are merged. Only the integer codes are rewritten.
+    """
+    values = pd.Index(values, dtype=object)
+    if len(values) != len(s.cat.categories):
+        raise ValueError('Expected {} values, got {}'.format(len(s.cat.categories), len(values)))
+    valid = values.notna()
+    categories = pd.Index(values[valid].unique(), dtype=object)
+    #Lookup array from old code to new code, with -1 for missing
+    lookup = np.full(len(values) + 1, -1, dtype=np.int32)
+    lookup[:-1][valid] = categories.get_indexer(values[valid])
+    codes = lookup[s.cat.codes.to_numpy()]
+    categories = categories.astype(s.cat.categories.dtype) if len(categories) else categories
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=s.index, name=s.name)
+
+
+def strip(s):
+    """Strip surrounding whitespace from every category of ``s``."""
+    return remap(s, s.cat.categories.astype(object).str.strip())
+
+
+def fillna(s, value):
+    """Fill the missing rows of categorical ``s`` with ``value``."""
+    if value not in s.cat.categories:
+        s = s.cat.add_categories([value])
+    return s.fillna(value)
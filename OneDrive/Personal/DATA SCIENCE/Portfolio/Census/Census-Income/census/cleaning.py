@@ -0,0 +1,234 @@
+"""Cleaning steps shared by the training, test and scoring data."""
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from census import categorical
+from census.data import create_store, iter_census, write_part
+from census.dedup import drop_duplicates
+from census.schema import (CAPS, COUNTRY_COLUMNS, EXCLUDED_COLUMNS, MISSING_COLUMNS, NA_FILL_COLUMNS,
+                           NEGATIVE_INCOME, NUMERIC_DTYPES, PARSE_DROP_COLUMNS, RECODES, RENAMES, SENTINELS, TARGET,
+                           WEIGHT_COLUMNS)
+
+
+def replace_sentinels(df, sentinels=SENTINELS):
+    """Turn sentinel values into nulls in one pass and count the nulls.
+
+    ``sentinels`` maps column names to the values that mean "missing" in
+    that column. Categorical columns are rewritten through their category
+    dictionary, and the per-column null counts fall out of the same code
+    histogram, so no separate ``isnull().sum()`` scan is needed.
+
+    Returns the cleaned frame and a Series of null counts per column.
+    """
+    df = df.copy()
+    nulls = {}
+    for col in df.columns:
+        s = df[col]
+        values = sentinels.get(col, ())
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            categories = s.cat.categories
+            is_sentinel = categories.isin(values)
+            counts = np.bincount(s.cat.codes.to_numpy() + 1, minlength=len(categories) + 1)
+            nulls[col] = int(counts[0] + counts[1:][is_sentinel].sum())
+            if is_sentinel.any():
+                df[col] = categorical.remap(s, categories.astype(object).where(~is_sentinel))
+        else:
+            if len(values):
+                s = s.where(~s.isin(values))
+                df[col] = s
+            nulls[col] = int(s.isna().sum())
+    return df, pd.Series(nulls, dtype='int64')
+
+
+def recode_values(values, recode):
+    """Return ``values`` passed through ``recode``, as a list."""
+    return [recode.mapping.get(x, x if recode.other is None else recode.other) for x in values]
+
+
+def apply_recode(s, recode):
+    """Apply a ``Recode`` to a Series, evaluating it once per distinct value.
+
+    Categorical columns are remapped through their dictionary. Other columns
+    are factorized first and mapped with a lookup array. Recodes whose
+    outputs are all integers produce an ``int8`` flag column.
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+    else:
+        codes, uniques = pd.factorize(s)
+    values = recode_values(uniques, recode)
+    #Missing values are treated like any unlisted value, the last lookup slot holds them
+    missing = recode.other
+    if all(isinstance(v, (int, np.integer)) for v in list(recode.mapping.values()) + [recode.other]):
+        lookup = np.array(values + [missing], dtype=np.int8)
+        return pd.Series(lookup[codes], index=s.index, name=s.name)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = categorical.remap(s, values)
+        return s if missing is None else categorical.fillna(s, missing)
+    lookup = np.array(values + [np.nan if missing is None else missing], dtype=object)
+    return pd.Series(lookup[codes], index=s.index, name=s.name)
+
+
+def recode(df, recodes=RECODES, caps=CAPS, renames=RENAMES):
+    """Group and rename values as decided in the EDA section.
+
+    ``recodes`` maps columns to ``Recode`` entries, ``caps`` clips numeric
+    columns from above and ``renames`` renames columns afterwards. Columns
+    missing from ``df`` are skipped.
+    """
+    df = df.copy()
+    for col, rule in recodes.items():
+        if col in df:
+            df[col] = apply_recode(df[col], rule)
+    for col, upper in caps.items():
+        if col in df:
+            df[col] = df[col].clip(upper=upper)
+    return df.rename(columns=renames)
+
+
+def clean(df, sentinels=SENTINELS, recodes=RECODES):
+    """Run the cleaning section of the analysis on a raw frame.
+
+    Replaces sentinels, drops the unused columns and the rows missing a
+    country of birth, fills the not-working categories with 'NA', derives
+    the ``Income>50k`` label and applies the EDA recodes.
+    """
+    df, _ = replace_sentinels(df, sentinels)
+    df = df.drop(columns=[c for c in WEIGHT_COLUMNS + MISSING_COLUMNS if c in df])
+    country = [c for c in COUNTRY_COLUMNS if c in df]
+    if country:
+        df = df.dropna(subset=country)
+    for col in NA_FILL_COLUMNS:
+        if col in df:
+            df[col] = categorical.fillna(df[col], 'NA')
+    if 'Income' in df:
+        df[TARGET] = (df['Income'] != NEGATIVE_INCOME).astype('int8')
+        df = df.drop(columns='Income')
+    df = recode(df, recodes)
+    return df.drop(columns=[c for c in EXCLUDED_COLUMNS if c in df])
+
+
+def clean_file(path, directory, chunksize=100000, sentinels=SENTINELS, drop=PARSE_DROP_COLUMNS, seen=None):
+    """Clean a census-income file chunk by chunk into an on-disk store.
+
+    Each chunk is parsed, cleaned with ``clean`` and written as one part of
+    the store in ``directory``, so peak memory is bounded by ``chunksize``.
+    Read the result back with ``data.read_store`` or ``data.iter_store``.
+
+    Pass a ``dedup.FingerprintSet`` as ``seen`` to drop duplicate rows across
+    the whole stream, including rows seen in earlier runs if the set is
+    persisted. Like the notebook's ``drop_duplicates``, rows are compared on
+    every column but ``WEIGHT_COLUMNS``, whatever ``drop`` is; those columns
+    are parsed for the comparison and dropped after it.
+
+    An existing store in ``directory`` is replaced; any other non-empty
+    directory raises a ValueError (see ``data.create_store``).
+
+    Returns the number of rows read and written.
+    """
+    create_store(directory)
+    parse_drop = drop if seen is None else [c for c in drop if c in WEIGHT_COLUMNS]
+    rows_in = rows_out = 0
+    for number, chunk in enumerate(iter_census(path, parse_drop, chunksize)):
+        rows_in += len(chunk)
+        if seen is not None:
+            chunk = drop_duplicates(chunk.drop(columns=[c for c in WEIGHT_COLUMNS if c in chunk]), seen)
+            chunk = chunk.drop(columns=[c for c in drop if c in chunk])
+        chunk = clean(chunk, sentinels)
+        rows_out += len(chunk)
+        write_part(chunk, directory, number)
+    return rows_in, rows_out
+
+
+class CensusCleaner(BaseEstimator, TransformerMixin):
+    """Cleaning pipeline fitted once on training data and reused everywhere.
+
+    ``fit`` runs ``clean`` on the training frame and remembers the output
+    columns and category dictionaries. ``transform`` cleans any later frame
+    (the test file, a scoring batch) and casts it to exactly those
+    dictionaries, so values unseen in training become missing instead of
+    silently adding categories. The fitted object pickles with ``joblib``.
+
+    ``transform_records`` is the small-batch path for online scoring: it
+    cleans a list of dicts with precomputed per-value lookups and no pandas
+    overhead.
+    """
+
+    def __init__(self, sentinels=SENTINELS, recodes=RECODES):
+        self.sentinels = sentinels
+        self.recodes = recodes
+
+    def fit(self, X, y=None):
+        cleaned = clean(X, self.sentinels, self.recodes)
+        self.columns_ = list(cleaned.columns)
+        self.dtypes_ = cleaned.dtypes.to_dict()
+        #Raw value -> cleaned value, per input column, for the record path
+        self.lookups_ = {}
+        for col in X.columns:
+            if isinstance(X[col].dtype, pd.CategoricalDtype) and self._output_name(col) in self.columns_:
+                self.lookups_[col] = {x: self._clean_value(col, x) for x in X[col].cat.categories}
+        return self
+
+    def transform(self, X):
+        df = clean(X, self.sentinels, self.recodes)
+        for col in self.columns_:
+            if col not in df:
+                continue
+            dtype = self.dtypes_[col]
+            if isinstance(dtype, pd.CategoricalDtype):
+                df[col] = df[col].cat.set_categories(dtype.categories)
+            elif df[col].dtype != dtype:
+                df[col] = df[col].astype(dtype)
+        return df[[c for c in self.columns_ if c in df]]
+
+    def transform_records(self, records):
+        """Clean a small batch of raw records given as dicts.
+
+        Unlike ``transform`` no rows are dropped, so every record gets a
+        result. Values unseen in training come back as None.
+        """
+        out = []
+        for record in records:
+            row = {}
+            for col, value in record.items():
+                name = self._output_name(col)
+                if name not in self.columns_:
+                    continue
+                lookup = self.lookups_.get(col)
+                if lookup is not None and value in lookup:
+                    row[name] = lookup[value]
+                else:
+                    row[name] = self._check_value(name, self._clean_value(col, value))
+            out.append(row)
+        return out
+
+    def _output_name(self, col):
+        if col == 'Income':
+            return TARGET
+        return RENAMES.get(col, col)
+
+    def _clean_value(self, col, value):
+        """Clean one raw value, following the same rules as ``clean``."""
+        if isinstance(value, str):
+            value = value.strip()
+        if col == 'Income':
+            return int(value != NEGATIVE_INCOME)
+        if col in NUMERIC_DTYPES and value is not None:
+            value = float(value) if NUMERIC_DTYPES[col].startswith('float') else int(value)
+        if value in self.sentinels.get(col, ()):
+            value = None
+        if value is None and col in NA_FILL_COLUMNS:
+            value = 'NA'
+        if col in self.recodes:
+            value = recode_values([value], self.recodes[col])[0]
+        if col in CAPS and value is not None:
+            value = min(value, CAPS[col])
+        return value
+
+    def _check_value(self, name, value):
+        dtype = self.dtypes_[name]
+        if isinstance(dtype, pd.CategoricalDtype) and value not in dtype.categories:
+            return None
+        return value
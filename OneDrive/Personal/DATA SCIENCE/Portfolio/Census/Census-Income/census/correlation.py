@@ -0,0 +1,185 @@
+"""Correlation matrices accumulated over chunks.
+
+``CorrelationAccumulator`` keeps the row count, column means and the matrix
+of centered cross-products. Each chunk is reduced to the same statistics and
+merged with the pairwise update of Chan et al., which stays numerically
+stable where raw sums of squares would not. Wide inputs such as the one-hot
+matrix are processed in column blocks so only one block is centered at a
+time. scipy sparse chunks use raw cross-products for their sparse columns
+and centered blocks only for the columns whose mean would make that
+subtraction lose precision, which are the mostly non-zero ones.
+Results can be saved and are cached by ``correlation`` and
+``store_correlation``, so the heatmap cells re-render without rescanning the
+data. The cache is keyed on something cheap, such as the hash of the source
+file or the layout of the store, because hashing the data itself would cost
+another full pass.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from census.data import CACHE_DIR, CACHE_VERSION, iter_store, store_hash
+
+
+def numeric_columns(df):
+    """Columns ``df.corr()`` would use: numeric and not categorical."""
+    return [c for c in df.columns
+            if pd.api.types.is_numeric_dtype(df[c].dtype) and not isinstance(df[c].dtype, pd.CategoricalDtype)]
+
+
+class CorrelationAccumulator:
+    """Mergeable sufficient statistics for a Pearson correlation matrix.
+
+    Input chunks must not contain missing values.
+    """
+
+    def __init__(self, columns, block=256):
+        self.columns = list(columns)
+        self.block = block
+        d = len(self.columns)
+        self.n = 0
+        self.mean = np.zeros(d)
+        self.comoment = np.zeros((d, d))
+
+    def update(self, X):
+        """Add a chunk given as a frame, an array or a scipy sparse matrix."""
+        if isinstance(X, pd.DataFrame):
+            X = X[self.columns].to_numpy(dtype=np.float64)
+        n = X.shape[0]
+        if not n:
+            return self
+        if sp.issparse(X):
+            mean, comoment = self._sparse_comoment(X.tocsc())
+        else:
+            mean = X.mean(axis=0)
+            d = X.shape[1]
+            comoment = np.empty((d, d))
+            blocks = [slice(i, min(i + self.block, d)) for i in range(0, d, self.block)]
+            for a, rows in enumerate(blocks):
+                left = X[:, rows] - mean[rows]
+                for cols in blocks[a:]:
+                    right = left if cols == rows else X[:, cols] - mean[cols]
+                    comoment[rows, cols] = left.T @ right
+                    comoment[cols, rows] = comoment[rows, cols].T
+        return self._merge(n, mean, comoment)
+
+    def _sparse_comoment(self, X):
+        """Column means and centered cross-products of a CSC chunk.
+
+        Raw cross-products ``X.T @ X - n * outer(mean, mean)`` keep the chunk
+        sparse and are exact enough for columns whose mean is small next to
+        their spread, such as the dummies. Columns where the squared mean is
+        more than half of the mean square would lose precision in that
+        subtraction; they are mostly non-zero anyway, so their rows of the
+        result are recomputed from centered dense blocks instead.
+        """
+        n = X.shape[0]
+        mean = np.asarray(X.mean(axis=0)).ravel()
+        comoment = (X.T @ X).toarray() - n * np.outer(mean, mean)
+        squares = np.asarray(X.multiply(X).sum(axis=0)).ravel()
+        dense = np.flatnonzero(n * mean * mean > 0.5 * squares)
+        blocks = [dense[i:i + self.block] for i in range(0, len(dense), self.block)]
+        for rows in blocks:
+            left = X[:, rows].toarray() - mean[rows]
+            #sum_i left_ir * (x_ij - mean_j), without forming the centered sparse columns
+            cross = (X.T @ left).T - np.outer(left.sum(axis=0), mean)
+            comoment[rows, :] = cross
+            comoment[:, rows] = cross.T
+        #Pairs of such columns are centered on both sides, as in the dense path
+        for a, rows in enumerate(blocks):
+            left = X[:, rows].toarray() - mean[rows]
+            for cols in blocks[a:]:
+                right = left if cols is rows else X[:, cols].toarray() - mean[cols]
+                comoment[np.ix_(rows, cols)] = left.T @ right
+                comoment[np.ix_(cols, rows)] = comoment[np.ix_(rows, cols)].T
+        return mean, comoment
+
+    def merge(self, other):
+        return self._merge(other.n, other.mean, other.comoment)
+
+    def _merge(self, n, mean, comoment):
+        total = self.n + n
+        delta = mean - self.mean
+        self.comoment += comoment + np.outer(delta, delta) * (self.n * n / total)
+        self.mean += delta * (n / total)
+        self.n = total
+        return self
+
+    def corr(self):
+        """Return the correlation matrix as a frame, like ``df.corr()``."""
+        std = np.sqrt(np.diag(self.comoment))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = self.comoment / np.outer(std, std)
+        np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(path, n=self.n, mean=self.mean, comoment=self.comoment, columns=np.asarray(self.columns, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        acc = cls(data['columns'].tolist())
+        acc.n, acc.mean, acc.comoment = int(data['n']), data['mean'], data['comoment']
+        return acc
+
+
+def _cache_path(key, cache_dir=None):
+    key = hashlib.sha256('{}:{}'.format(CACHE_VERSION, key).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir or CACHE_DIR, 'corr-{}.npz'.format(key))
+
+
+def correlation(X, columns=None, chunksize=100000, key=None, cache=True, cache_dir=None):
+    """Correlation matrix of ``X``, computed in row chunks.
+
+    ``X`` may be a frame, whose numeric columns are used unless ``columns``
+    is given, or a dense array or scipy sparse matrix such as the one-hot
+    design matrix, with ``columns`` naming its columns.
+
+    The accumulated statistics are cached only when ``key`` identifies the
+    data, e.g. the ``file_hash`` of the file it was read from; hashing ``X``
+    itself would scan every row on every call.
+    """
+    if isinstance(X, pd.DataFrame):
+        columns = numeric_columns(X) if columns is None else list(columns)
+        X = X[columns]
+    elif sp.issparse(X):
+        X = sp.csr_matrix(X)
+    else:
+        X = np.asarray(X)
+    columns = list(range(X.shape[1])) if columns is None else list(columns)
+    path = None
+    if cache and key is not None:
+        path = _cache_path('{}:{}'.format(key, columns), cache_dir)
+        if os.path.isfile(path):
+            return CorrelationAccumulator.load(path).corr()
+    acc = CorrelationAccumulator(columns)
+    for start in range(0, X.shape[0], chunksize):
+        acc.update(X.iloc[start:start + chunksize] if isinstance(X, pd.DataFrame) else X[start:start + chunksize])
+    if path is not None:
+        acc.save(path)
+    return acc.corr()
+
+
+def store_correlation(directory, cache=True, cache_dir=None):
+    """Correlation matrix of the numeric columns of a chunked store, one part at a time.
+
+    With ``cache=True`` the statistics are cached under the ``store_hash`` of
+    the store, which only reads the metadata of its parts.
+    """
+    path = _cache_path('store:{}'.format(store_hash(directory)), cache_dir) if cache else None
+    if path is not None and os.path.isfile(path):
+        return CorrelationAccumulator.load(path).corr()
+    acc = None
+    for part in iter_store(directory):
+        if acc is None:
+            acc = CorrelationAccumulator(numeric_columns(part))
+        acc.update(part)
+    if path is not None:
+        acc.save(path)
+    return acc.corr()
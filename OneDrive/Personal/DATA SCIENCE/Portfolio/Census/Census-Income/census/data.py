@@ -0,0 +1,265 @@
+"""Reading the census-income files, with an on-disk columnar cache.
+
+Parsing the comma delimited files dominates startup on large extracts, so
+the parsed frame is stored one column per ``.npy`` file, keyed by a hash of
+the source file. Later runs load the arrays directly and only re-parse when
+the file content changes. The same module holds the content hashes of
+frames and matrices that the other caches use as keys.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from pandas.api.types import union_categoricals
+
+from census import categorical
+from census.schema import COLUMNS, dtypes, usecols
+
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data')
+CACHE_DIR = os.path.join(DATA_DIR, '.census-cache')
+#Marks a directory written by ``create_store``
+STORE_MARKER = '.census-store'
+
+#Bump when the parsed layout changes so stale cache entries are ignored
+CACHE_VERSION = 3
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Return the sha256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def store_hash(directory):
+    """Return a hex digest of a chunked store's layout, without reading its data.
+
+    Parts are written whole by ``save_frame``, so the name, size and
+    modification time of each part's ``meta.json`` change whenever the
+    store does.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('part-'):
+            stat = os.stat(os.path.join(directory, name, 'meta.json'))
+            digest.update(repr((name, stat.st_size, stat.st_mtime_ns)).encode())
+    return digest.hexdigest()
+
+
+def cache_path(path, cache_dir=None, columns=COLUMNS):
+    """Return the cache directory for a source file, keyed by its content and the parsed columns."""
+    signature = '{}:{}:{}'.format(CACHE_VERSION, file_hash(path), ','.join(columns))
+    key = hashlib.sha256(signature.encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir or CACHE_DIR, '{}-{}'.format(name, key))
+
+
+def frame_hash(df):
+    """Return a hex digest identifying the content and layout of ``df``."""
+    digest = hashlib.sha256()
+    digest.update(repr([(c, str(df[c].dtype)) for c in df.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def matrix_hash(X, y=None):
+    """Return a hex digest identifying a design matrix and its target.
+
+    ``X`` may be a frame, a dense array or a sparse matrix; sparse matrices
+    hash their canonical CSR form.
+    """
+    digest = hashlib.sha256()
+    if isinstance(X, pd.DataFrame):
+        digest.update(frame_hash(X).encode())
+    elif sp.issparse(X):
+        X = sp.csr_matrix(X)
+        X.sum_duplicates()
+        digest.update(repr(('csr', X.shape, str(X.dtype))).encode())
+        for part in (X.indptr, X.indices, X.data):
+            digest.update(np.ascontiguousarray(part).tobytes())
+    else:
+        X = np.ascontiguousarray(X)
+        digest.update(repr(('dense', X.shape, str(X.dtype))).encode())
+        digest.update(X.tobytes())
+    if y is not None:
+        y = np.ascontiguousarray(y)
+        digest.update(repr((y.shape, str(y.dtype))).encode())
+        digest.update(y.tobytes())
+    return digest.hexdigest()
+
+
+@contextmanager
+def atomic_directory(directory):
+    """Yield a temporary directory that replaces ``directory`` once the block completes.
+
+    The temporary directory is created next to ``directory`` so the final
+    rename stays on one filesystem, and it is removed if the block raises.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    try:
+        yield tmp
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    #Swap the finished directory in, so a crash never leaves a half written entry
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.replace(tmp, directory)
+
+
+def save_frame(df, directory):
+    """Write a frame as one ``.npy`` file per column.
+
+    String and categorical columns are stored as integer codes plus a
+    separate array of categories, so no pickling is needed on load.
+    """
+    with atomic_directory(directory) as tmp:
+        meta = {'columns': [], 'index': 'range'}
+        for i, col in enumerate(df.columns):
+            s = df[col]
+            entry = {'name': col, 'dtype': str(s.dtype)}
+            if pd.api.types.is_numeric_dtype(s.dtype) and not isinstance(s.dtype, pd.CategoricalDtype):
+                np.save(os.path.join(tmp, '{}.npy'.format(i)), s.to_numpy())
+            else:
+                cat = s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype('category')
+                entry['categorical'] = True
+                np.save(os.path.join(tmp, '{}.npy'.format(i)), cat.cat.codes.to_numpy())
+                np.save(os.path.join(tmp, '{}.categories.npy'.format(i)),
+                        np.asarray(cat.cat.categories.astype(str), dtype=str))
+            meta['columns'].append(entry)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+
+def load_frame(directory, mmap_mode=None):
+    """Read a frame written by ``save_frame``."""
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    data = {}
+    for i, entry in enumerate(meta['columns']):
+        values = np.load(os.path.join(directory, '{}.npy'.format(i)), mmap_mode=mmap_mode)
+        if entry.get('categorical'):
+            categories = np.load(os.path.join(directory, '{}.categories.npy'.format(i))).astype(object)
+            values = pd.Categorical.from_codes(np.asarray(values), categories=categories)
+            if entry['dtype'] != 'category':
+                values = pd.Series(values).astype(object if entry['dtype'] == 'object' else entry['dtype'])
+        data[entry['name']] = values
+    return pd.DataFrame(data)
+
+
+def _read_csv(path, drop=(), **kwargs):
+    columns = usecols(drop)
+    return pd.read_csv(path, header=None, names=COLUMNS, usecols=columns, dtype=dtypes(columns),
+                       skipinitialspace=True, keep_default_na=False, **kwargs)
+
+
+def parse_census(path, drop=()):
+    """Parse a raw census-income file into a frame with named columns.
+
+    Columns in ``drop`` are pruned by the reader itself, so they are never
+    tokenized or allocated. The remaining columns get the schema dtypes:
+    categoricals for nominal fields and small ints/float32 for numbers.
+
+    Fields are separated by ", ", so the tokenizer skips the leading space.
+    The few values with trailing blanks are stripped on the category
+    dictionaries, once per distinct value. Default NA parsing is disabled
+    because 'NA' is a genuine HispanicOrigin value once the space is gone.
+    """
+    return strip_whitespace(_read_csv(path, drop))
+
+
+def iter_census(path, drop=(), chunksize=100000):
+    """Parse a census-income file in chunks of ``chunksize`` rows.
+
+    Each chunk is typed and stripped exactly like ``parse_census``, so peak
+    memory is bounded by the chunk size rather than the file size.
+    """
+    with _read_csv(path, drop, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield strip_whitespace(chunk)
+
+
+def strip_whitespace(df):
+    """Strip surrounding whitespace from every categorical column of ``df``."""
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = categorical.strip(df[col])
+    return df
+
+
+def read_census(path, drop=(), cache=True, cache_dir=None):
+    """Read a census-income file, reusing the columnar cache when it is fresh.
+
+    ``drop`` lists columns to prune at parse time, typically
+    ``schema.DROP_COLUMNS`` or ``schema.PARSE_DROP_COLUMNS``. The cache entry
+    is keyed by the file content and the parsed columns, so editing or
+    replacing the file triggers a re-parse. Pass ``cache=False`` to always
+    parse.
+    """
+    if not cache:
+        return parse_census(path, drop)
+    directory = cache_path(path, cache_dir, usecols(drop))
+    if os.path.isfile(os.path.join(directory, 'meta.json')):
+        return load_frame(directory)
+    df = parse_census(path, drop)
+    save_frame(df, directory)
+    return df
+
+
+def create_store(directory):
+    """Create an empty chunked store in ``directory``, replacing an earlier store.
+
+    A directory is only removed if it is empty or is already a store (it
+    holds the ``STORE_MARKER`` file or only ``part-*`` entries), so a
+    mistyped path never deletes other data.
+    """
+    if os.path.isdir(directory) and os.listdir(directory):
+        entries = os.listdir(directory)
+        if STORE_MARKER not in entries and not all(e.startswith('part-') for e in entries):
+            raise ValueError('{} is not empty and is not a census store, refusing to overwrite it'.format(directory))
+        shutil.rmtree(directory)
+    os.makedirs(directory, exist_ok=True)
+    open(os.path.join(directory, STORE_MARKER), 'w').close()
+
+
+def write_part(df, directory, number):
+    """Append ``df`` to the chunked store in ``directory`` as part ``number``."""
+    save_frame(df.reset_index(drop=True), os.path.join(directory, 'part-{:05d}'.format(number)))
+
+
+def iter_store(directory, mmap_mode=None):
+    """Yield the parts of a chunked store in order."""
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('part-'):
+            yield load_frame(os.path.join(directory, name), mmap_mode=mmap_mode)
+
+
+def read_store(directory):
+    """Read a whole chunked store into one frame.
+
+    Each part carries its own category dictionary, so categorical columns are
+    merged with ``union_categoricals`` instead of falling back to objects.
+    """
+    parts = list(iter_store(directory))
+    if not parts:
+        raise ValueError('No parts found in {}'.format(directory))
+    data = {}
+    for col in parts[0].columns:
+        if isinstance(parts[0][col].dtype, pd.CategoricalDtype):
+            data[col] = union_categoricals([p[col] for p in parts])
+        else:
+            data[col] = np.concatenate([p[col].to_numpy() for p in parts])
+    return pd.DataFrame(data)
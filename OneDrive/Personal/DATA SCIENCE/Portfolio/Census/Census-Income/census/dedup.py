@@ -0,0 +1,121 @@
+"""Duplicate detection through 64-bit row fingerprints.
+
+Each row is reduced to one ``uint64`` hash of its typed values. Categorical
+columns hash by value rather than by code, so fingerprints agree across
+chunks and files that carry different category dictionaries. Seen
+fingerprints are kept as a sorted array that can be saved and reloaded, so
+re-ingested extracts skip rows that were already loaded.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def fingerprints(df):
+    """Return one 64-bit fingerprint per row of ``df``."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def signature(df):
+    """Return the column names and dtypes that fingerprints of ``df`` depend on."""
+    return [[col, str(df[col].dtype)] for col in df.columns]
+
+
+class FingerprintSet:
+    """Sorted set of row fingerprints, optionally persisted to ``path``.
+
+    Also counts the rows checked and the duplicates found, so the duplicate
+    rate of a whole stream can be reported at the end. Fingerprints only
+    compare between frames with the same columns and dtypes, so the set
+    records the ``signature`` of the first frame checked against it and
+    saves it next to the ``.npy`` file as JSON. ``check`` raises a
+    ValueError for a frame with another signature.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.signature = None
+        if path is not None and os.path.isfile(path):
+            self.values = np.load(path)
+            if os.path.isfile(self._signature_path(path)):
+                with open(self._signature_path(path)) as f:
+                    self.signature = json.load(f)
+        else:
+            self.values = np.empty(0, dtype=np.uint64)
+        self.rows = 0
+        self.duplicates = 0
+
+    @staticmethod
+    def _signature_path(path):
+        return os.path.splitext(path)[0] + '.json'
+
+    def check(self, df):
+        """Record the signature of ``df``, or raise if it differs from the recorded one."""
+        current = signature(df)
+        if self.signature is None:
+            self.signature = current
+        elif current != self.signature:
+            raise ValueError('Fingerprints were built on columns {}, not {}'.format(self.signature, current))
+
+    def __len__(self):
+        return len(self.values)
+
+    def contains(self, fps):
+        """Return a boolean mask of the fingerprints already in the set."""
+        pos = np.searchsorted(self.values, fps)
+        pos[pos == len(self.values)] = 0
+        return self.values[pos] == fps if len(self.values) else np.zeros(len(fps), dtype=bool)
+
+    def add(self, fps):
+        """Add fingerprints and return the mask of rows seen for the first time.
+
+        A row is a duplicate if it was seen in an earlier batch or earlier in
+        this one.
+        """
+        new = ~pd.Series(fps).duplicated().to_numpy() & ~self.contains(fps)
+        self.values = np.union1d(self.values, fps[new])
+        self.rows += len(fps)
+        self.duplicates += int(len(fps) - new.sum())
+        return new
+
+    @property
+    def duplicate_rate(self):
+        return self.duplicates / self.rows if self.rows else 0.0
+
+    def save(self, path=None):
+        path = path or self.path
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        np.save(path, self.values)
+        if self.signature is not None:
+            with open(self._signature_path(path), 'w') as f:
+                json.dump(self.signature, f)
+
+
+def drop_duplicates(df, seen=None):
+    """Drop rows of ``df`` that are repeated within it or already in ``seen``.
+
+    ``seen`` is a ``FingerprintSet`` shared across chunks; the surviving rows
+    are added to it. Without one this behaves like ``df.drop_duplicates()``.
+    """
+    seen = FingerprintSet() if seen is None else seen
+    seen.check(df)
+    return df[seen.add(fingerprints(df))]
+
+
+def overlap_report(train, test):
+    """Report duplicate rates within each frame and of test rows found in train."""
+    train_fps = fingerprints(train)
+    test_fps = fingerprints(test[train.columns])
+    seen = FingerprintSet()
+    seen.add(train_fps)
+    return pd.Series({
+        'train_rows': len(train_fps),
+        'train_duplicate_rate': seen.duplicate_rate,
+        'test_rows': len(test_fps),
+        'test_duplicate_rate': float(pd.Series(test_fps).duplicated().mean()) if len(test_fps) else 0.0,
+        'test_in_train_rate': float(seen.contains(test_fps).mean()) if len(test_fps) else 0.0,
+    })
@@ -0,0 +1,191 @@
+"""One-hot encoding with a vocabulary learned once from the training data.
+
+Calling ``pd.get_dummies`` separately on train and test gives different
+column sets whenever a value is missing from one of the files.
+``OneHotEncoder`` learns each column's values on the training data,
+persists them as JSON, and maps any later batch onto exactly the same
+layout: every value is turned into its column position with one
+integer-code gather and the dummies are set with one scatter.
+
+``transform_sparse`` emits the same layout as a CSR matrix, and
+``SparseScaler`` standardizes it without densifying the dummy block, so
+the models can be trained on a design matrix a fraction of the size.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from census.profile import _scalar
+from census.schema import ONE_HOT_COLUMNS, TARGET
+
+
+class OneHotEncoder(BaseEstimator, TransformerMixin):
+    """Aligned one-hot encoder for the census frames.
+
+    The output has the layout the notebook gets from ``pd.get_dummies`` on
+    the object-typed training frame: the other columns first, then
+    ``<column>_<value>`` dummies with each column's values sorted as
+    strings. For categorical columns ``get_dummies`` follows the category
+    order instead, so the two only agree when the categories are sorted.
+    The target column is left out.
+
+    ``handle_unknown`` decides what happens to values not seen in training:
+    'ignore' leaves all of that column's dummies at 0, 'error' raises a
+    ValueError. Either way ``unknown_counts_`` reports how many rows of the
+    last batch had unseen values, per column. Missing values are not unseen
+    values: their dummies are all 0, as with ``get_dummies``.
+    """
+
+    def __init__(self, columns=ONE_HOT_COLUMNS, handle_unknown='ignore', target=TARGET):
+        self.columns = columns
+        self.handle_unknown = handle_unknown
+        self.target = target
+
+    def fit(self, X, y=None):
+        self.vocabulary_ = {}
+        for col in self.columns:
+            s = X[col]
+            values = s.cat.categories[np.unique(s.cat.codes[s.cat.codes >= 0])] \
+                if isinstance(s.dtype, pd.CategoricalDtype) else s.dropna().unique()
+            self.vocabulary_[col] = sorted(values, key=str)
+        self.passthrough_ = [c for c in X.columns if c not in self.columns and c != self.target]
+        self._build()
+        return self
+
+    def _build(self):
+        self.feature_names_ = list(self.passthrough_)
+        self.offsets_ = {}
+        for col in self.columns:
+            self.offsets_[col] = len(self.feature_names_)
+            self.feature_names_ += ['{}_{}'.format(col, v) for v in self.vocabulary_[col]]
+
+    def feature_groups(self):
+        """Feature positions of each input column: one for a passthrough
+        column, the whole dummy block for an encoded one."""
+        groups = {col: np.array([i]) for i, col in enumerate(self.passthrough_)}
+        for col in self.columns:
+            groups[col] = np.arange(self.offsets_[col], self.offsets_[col] + len(self.vocabulary_[col]))
+        return groups
+
+    def codes(self, s, col):
+        """Position of each value of ``s`` in the fitted vocabulary of ``col``, -1 if unseen."""
+        vocabulary = pd.Index(self.vocabulary_[col])
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            #One lookup per category, then a gather over the row codes
+            lookup = np.append(vocabulary.get_indexer(s.cat.categories), -1)
+            return lookup[s.cat.codes.to_numpy()]
+        return vocabulary.get_indexer(s)
+
+    def dummy_positions(self, X):
+        """Return the row and dummy-block column of every 1 in ``X``'s dummies, and the row count."""
+        n = len(X)
+        rows, positions = [], []
+        self.unknown_counts_ = {}
+        for col in self.columns:
+            codes = self.codes(X[col], col)
+            #Missing rows get all-zero dummies, as in get_dummies, and are not unseen values
+            unknown = (codes < 0) & X[col].notna().to_numpy()
+            self.unknown_counts_[col] = int(unknown.sum())
+            if unknown.any() and self.handle_unknown == 'error':
+                raise ValueError('Unseen values in {}: {}'.format(col, sorted(set(X[col][unknown].astype(str)))))
+            known = np.flatnonzero(codes >= 0)
+            rows.append(known)
+            positions.append(codes[known] - len(self.passthrough_) + self.offsets_[col])
+        empty = np.empty(0, dtype=np.int64)
+        return (np.concatenate(rows) if rows else empty), (np.concatenate(positions) if positions else empty), n
+
+    def transform(self, X):
+        rows, positions, n = self.dummy_positions(X)
+        dummies = np.zeros((n, len(self.feature_names_) - len(self.passthrough_)), dtype=np.uint8)
+        dummies[rows, positions] = 1
+        out = pd.DataFrame(dummies, index=X.index, columns=self.feature_names_[len(self.passthrough_):])
+        return pd.concat([X[self.passthrough_], out], axis=1)
+
+    def transform_sparse(self, X, dtype=np.float64):
+        """Encode ``X`` into a CSR matrix with the ``feature_names_`` layout.
+
+        Only the non-zero passthrough values and the one dummy per encoded
+        column are stored.
+        """
+        rows, positions, n = self.dummy_positions(X)
+        k = len(self.passthrough_)
+        parts_rows, parts_cols, parts_data = [rows], [positions + k], [np.ones(len(rows), dtype=dtype)]
+        for j, col in enumerate(self.passthrough_):
+            values = X[col].to_numpy(dtype=dtype)
+            nz = np.flatnonzero(values)
+            parts_rows.append(nz)
+            parts_cols.append(np.full(len(nz), j))
+            parts_data.append(values[nz])
+        return sp.csr_matrix((np.concatenate(parts_data), (np.concatenate(parts_rows), np.concatenate(parts_cols))),
+                             shape=(n, len(self.feature_names_)), dtype=dtype)
+
+    def save(self, path):
+        """Write the fitted vocabulary and layout as JSON."""
+        state = {'columns': list(self.columns), 'handle_unknown': self.handle_unknown, 'target': self.target,
+                 'vocabulary': {c: [_scalar(v) for v in vs] for c, vs in self.vocabulary_.items()},
+                 'passthrough': self.passthrough_}
+        with open(path, 'w') as f:
+            json.dump(state, f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            state = json.load(f)
+        encoder = cls(state['columns'], state['handle_unknown'], state['target'])
+        encoder.vocabulary_ = state['vocabulary']
+        encoder.passthrough_ = state['passthrough']
+        encoder._build()
+        return encoder
+
+
+class SparseScaler(BaseEstimator, TransformerMixin):
+    """Standardize an encoded matrix without densifying its dummy block.
+
+    The first ``n_dense`` columns, the numeric passthrough columns, are
+    centered and scaled like ``StandardScaler``. The remaining dummy columns
+    are only divided by their standard deviation (``with_mean=False``), or
+    left as 0/1 with ``scale_dummies=False``, so a sparse input stays sparse.
+    Dense float arrays are scaled in place unless ``copy=True``; the output
+    keeps the floating dtype of the input and, like ``StandardScaler``, is
+    computed in it.
+    """
+
+    def __init__(self, n_dense, scale_dummies=True, copy=True):
+        self.n_dense = n_dense
+        self.scale_dummies = scale_dummies
+        self.copy = copy
+
+    def fit(self, X, y=None):
+        X = sp.csr_matrix(X)
+        mean = np.asarray(X.mean(axis=0, dtype=np.float64)).ravel()
+        sq = np.asarray(X.multiply(X).mean(axis=0, dtype=np.float64)).ravel()
+        std = np.sqrt(np.maximum(sq - mean * mean, 0))
+        std[std == 0] = 1.0
+        self.mean_ = mean[:self.n_dense]
+        self.scale_ = std if self.scale_dummies else np.r_[std[:self.n_dense], np.ones(len(std) - self.n_dense)]
+        return self
+
+    def transform(self, X, copy=None):
+        copy = self.copy if copy is None else copy
+        k = self.n_dense
+        if not sp.issparse(X):
+            X = np.asarray(X)
+            if copy or X.dtype.kind != 'f':
+                X = X.astype(np.result_type(X.dtype, np.float32))
+            X[:, :k] -= self.mean_.astype(X.dtype)
+            X /= self.scale_.astype(X.dtype)
+            return X
+        X = sp.csr_matrix(X)
+        if X.dtype.kind != 'f':
+            X = X.astype(np.result_type(X.dtype, np.float32))
+        scale = self.scale_.astype(X.dtype)
+        numeric = X[:, :k].toarray()
+        numeric -= self.mean_.astype(X.dtype)
+        numeric /= scale[:k]
+        dummies = X[:, k:]
+        dummies.data /= scale[k:][dummies.indices]
+        return sp.hstack([sp.csr_matrix(numeric), dummies], format='csr', dtype=X.dtype)
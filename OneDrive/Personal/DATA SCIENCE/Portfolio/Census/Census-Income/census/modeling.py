@@ -0,0 +1,290 @@
+"""Model training helpers for the MODELING section.
+
+``design_matrices`` goes from the cleaned train and test frames to encoded,
+scaled matrices, as a scipy CSR matrix by default. Logistic regression,
+decision trees, random forests and ``cross_val_score`` all accept CSR input
+directly, so the design matrix never has to be densified.
+
+The matrices are float32 by default. Trees convert their input to float32
+anyway, logistic regression, SMOTE and the CV workers all accept it as is,
+so the matrix is never widened to float64 and every worker's copy is half
+the size.
+
+``fold_scaler`` compiles a model fitted on scaled features into one that
+scores the raw encoded features, so production scoring needs no scaler.
+
+``cv_scores`` writes the design matrix, the target and the fold indices
+once to a temporary directory. One process pool (``matrix_pool``, also used
+by ``selection.permutation_select``) memory-maps them and runs every
+(classifier, fold) pair, so adding a classifier adds fits but does not
+pickle the matrix again or rebuild the folds.
+"""
+
+import copy
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import check_cv
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from census.encoding import OneHotEncoder, SparseScaler
+from census.schema import TARGET
+
+
+def design_matrices(train, test, encoder=None, sparse=True, dtype=np.float32, scale_dummies=True):
+    """Encode and scale the cleaned train and test frames.
+
+    The encoder (fitted on ``train`` unless one is given) fixes the column
+    layout, and the scaler is fitted on the training matrix only. With
+    ``sparse=True`` the matrices are CSR and only the numeric columns are
+    centered; with ``sparse=False`` they are dense frames scaled with
+    ``StandardScaler`` as in the notebook. ``dtype`` is the precision of the
+    scaled values. With ``scale_dummies=False`` the dummies are left as 0/1,
+    which keeps them ``uint8`` in the dense frames.
+
+    Returns ``X_train, X_test, y_train, y_test, feature_names, scaler``.
+    """
+    encoder = encoder or OneHotEncoder().fit(train)
+    y_train, y_test = train[TARGET].to_numpy(), test[TARGET].to_numpy()
+    names, k = encoder.feature_names_, len(encoder.passthrough_)
+    if sparse:
+        X_train, X_test = encoder.transform_sparse(train, dtype), encoder.transform_sparse(test, dtype)
+        scaler = SparseScaler(k, scale_dummies, copy=False).fit(X_train)
+        return scaler.transform(X_train), scaler.transform(X_test), y_train, y_test, names, scaler
+    X_train, X_test = encoder.transform(train), encoder.transform(test)
+    if not scale_dummies:
+        scaler = SparseScaler(k, scale_dummies=False, copy=False).fit(X_train.to_numpy(dtype))
+        for X in (X_train, X_test):
+            numeric = X[names[:k]].to_numpy(dtype)
+            numeric -= scaler.mean_.astype(dtype)
+            numeric /= scaler.scale_[:k].astype(dtype)
+            X[names[:k]] = numeric
+        return X_train, X_test, y_train, y_test, names, scaler
+    scaler = StandardScaler(copy=False)
+    X_train = scaler.fit_transform(X_train.to_numpy(dtype))
+    X_test = scaler.transform(X_test.to_numpy(dtype))
+    X_train = pd.DataFrame(X_train, columns=names, copy=False)
+    X_test = pd.DataFrame(X_test, columns=names, copy=False)
+    return X_train, X_test, y_train, y_test, names, scaler
+
+
+def oversample(X, y, random_state=2):
+    """SMOTE oversampling of the training matrix, keeping its dtype.
+
+    Dense frames come back as frames with the same columns and dtypes. The
+    interpolated values of integer (``uint8`` dummy) columns are rounded, so
+    a synthetic row takes the nearer neighbour's category.
+    """
+    from imblearn.over_sampling import SMOTE
+    frame = isinstance(X, pd.DataFrame)
+    values = X.to_numpy(np.result_type(np.float32, *X.dtypes)) if frame else X
+    X_res, y_res = SMOTE(random_state=random_state).fit_resample(values, y)
+    if frame:
+        X_res = pd.DataFrame(X_res, columns=X.columns, copy=False)
+        integer = [col for col, dtype in X.dtypes.items() if dtype.kind in 'iu']
+        X_res[integer] = X_res[integer].round()
+        X_res = X_res.astype(X.dtypes.to_dict())
+    return X_res, y_res
+
+
+def scaler_affine(scaler, n_features=None):
+    """The fitted scaling as full-width ``(mean, scale)`` arrays.
+
+    Works for ``StandardScaler`` and ``SparseScaler``; ``SparseScaler`` does
+    not center its dummy columns, so their mean is 0.
+    """
+    if isinstance(scaler, SparseScaler):
+        scale = scaler.scale_
+        mean = np.r_[scaler.mean_, np.zeros(len(scale) - len(scaler.mean_))]
+    else:
+        n = scaler.n_features_in_
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(n)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n)
+    if n_features is not None and len(scale) != n_features:
+        raise ValueError('Scaler has {} features, the model {}'.format(len(scale), n_features))
+    return mean, scale
+
+
+def _raw_thresholds(threshold, mean, scale, dtype=np.float32, steps=16):
+    """Tree thresholds on scaled features mapped back to raw features.
+
+    Trees compare float32 features, and sklearn may put a threshold exactly
+    on a training value, so ``threshold * scale + mean`` can land a rounding
+    error on the wrong side of it. The result is snapped to the largest
+    float32 ``v`` whose scaled value is still ``<= threshold``, with the
+    scaling rounded the way it was computed in ``dtype``.
+    """
+    m, s = mean.astype(dtype), scale.astype(dtype)
+
+    def scaled(v):
+        return ((v.astype(dtype) - m) / s).astype(np.float32)
+
+    up, down = np.float32(np.inf), np.float32(-np.inf)
+    v = (threshold * scale + mean).astype(np.float32)
+    for _ in range(steps):
+        over = scaled(v) > threshold
+        if not over.any():
+            break
+        v[over] = np.nextafter(v[over], down)
+    for _ in range(steps):
+        step = np.nextafter(v, up)
+        under = scaled(step) <= threshold
+        if not under.any():
+            break
+        v[under] = step[under]
+    return v.astype(np.float64)
+
+
+def fold_scaler(model, scaler, features=None, dtype=np.float32, inplace=False):
+    """Fold a fitted scaler into a model fitted on the scaled features.
+
+    The model sees ``(x - mean) / scale``. For a linear model that is
+    ``coef / scale`` and ``intercept - (coef / scale) @ mean``; for trees a
+    split ``x_s <= t`` becomes ``x <= t * scale + mean``. The returned model
+    gives the same predictions on the raw encoded features as ``model`` on
+    the scaled ones (tree thresholds are snapped to float32, see
+    ``_raw_thresholds``). ``features`` selects the scaler columns the model was
+    fitted on, for example the ``SelectFromModel`` support, and ``dtype`` the
+    precision the scaled matrix was computed in. Supports linear
+    classifiers (``coef_``), decision trees and forests.
+    """
+    mean, scale = scaler_affine(scaler)
+    if features is not None:
+        mean, scale = mean[features], scale[features]
+    model = model if inplace else copy.deepcopy(model)
+    if hasattr(model, 'coef_'):
+        if model.coef_.shape[-1] != len(scale):
+            raise ValueError('Scaler has {} features, the model {}'.format(len(scale), model.coef_.shape[-1]))
+        model.coef_ = model.coef_ / scale
+        model.intercept_ = model.intercept_ - model.coef_ @ mean
+    elif hasattr(model, 'tree_') or hasattr(model, 'estimators_'):
+        for tree in getattr(model, 'estimators_', [model]):
+            if tree.n_features_in_ != len(scale):
+                raise ValueError('Scaler has {} features, the model {}'.format(len(scale), tree.n_features_in_))
+            #threshold and feature are views on the tree's node array
+            threshold, feature = tree.tree_.threshold, tree.tree_.feature
+            split = feature >= 0
+            threshold[split] = _raw_thresholds(threshold[split], mean[feature[split]], scale[feature[split]], dtype)
+    else:
+        raise TypeError('Cannot fold a scaler into {}'.format(type(model).__name__))
+    return model
+
+
+def default_classifiers(rs=42):
+    """The classifiers compared in the notebook, by name."""
+    return {'LogisticRegression': LogisticRegression(random_state=rs),
+            'DecisionTree': DecisionTreeClassifier(random_state=rs)}
+
+
+def save_matrix(X, directory):
+    """Write a dense or CSR design matrix as ``.npy`` files that ``load_matrix`` can memory-map."""
+    os.makedirs(directory, exist_ok=True)
+    if sp.issparse(X):
+        X = sp.csr_matrix(X)
+        for name in ('data', 'indices', 'indptr'):
+            np.save(os.path.join(directory, '{}.npy'.format(name)), getattr(X, name))
+    else:
+        np.save(os.path.join(directory, 'data.npy'), np.asarray(X))
+    with open(os.path.join(directory, 'matrix.json'), 'w') as f:
+        json.dump({'sparse': sp.issparse(X), 'shape': list(X.shape)}, f)
+
+
+def load_matrix(directory, mmap_mode='r'):
+    """Read a matrix written by ``save_matrix``, without copying its arrays."""
+    with open(os.path.join(directory, 'matrix.json')) as f:
+        meta = json.load(f)
+    arrays = [np.load(os.path.join(directory, '{}.npy'.format(name)), mmap_mode=mmap_mode)
+              for name in (('data', 'indices', 'indptr') if meta['sparse'] else ('data',))]
+    if meta['sparse']:
+        return sp.csr_matrix(tuple(arrays), shape=tuple(meta['shape']), copy=False)
+    return arrays[0]
+
+
+#Per-process state of the workers started by ``matrix_pool``
+_WORKER = {}
+
+
+def _init_worker(directory, state):
+    _WORKER.update(state, directory=directory, X=load_matrix(directory),
+                   y=np.load(os.path.join(directory, 'y.npy'), mmap_mode='r'))
+
+
+@contextmanager
+def matrix_pool(X, y, max_workers=None, **state):
+    """Process pool whose workers share ``X`` and ``y`` through memory-mapped files.
+
+    ``X`` and ``y`` are written once to a temporary directory with
+    ``save_matrix`` and mapped by each worker as it starts, so tasks only
+    carry their own arguments. Workers find ``X``, ``y``, the directory and
+    ``state`` in ``_WORKER``. Yields the pool and the directory.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        save_matrix(X, directory)
+        np.save(os.path.join(directory, 'y.npy'), np.asarray(y))
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(directory, state)) as pool:
+            yield pool, directory
+
+
+def _score_fold(classifier, fold, scoring):
+    X, y, directory = _WORKER['X'], _WORKER['y'], _WORKER['directory']
+    train = np.load(os.path.join(directory, 'train-{}.npy'.format(fold)))
+    test = np.load(os.path.join(directory, 'test-{}.npy'.format(fold)))
+    model = clone(classifier).fit(X[train], y[train])
+    return get_scorer(scoring)(model, X[test], y[test])
+
+
+def fold_scores(classifiers, X, y, cv=None, scoring='roc_auc', n_jobs=-1):
+    """Score every classifier on every fold of ``cv`` in one worker pool.
+
+    ``X`` (dense, frame or sparse), ``y`` and the fold indices are written
+    once and memory-mapped by the workers. Only the unfitted classifier and
+    the fold number are sent per task. Gives the same scores as
+    ``cross_val_score`` with the same ``cv``. Returns a long frame with one
+    row per (algorithm, fold).
+    """
+    X = X.to_numpy() if isinstance(X, pd.DataFrame) else X
+    y = np.asarray(y)
+    cv = check_cv(10 if cv is None else cv, y, classifier=True)
+    with matrix_pool(X, y, max_workers=None if n_jobs == -1 else n_jobs) as (pool, directory):
+        n_folds = 0
+        for n_folds, (train, test) in enumerate(cv.split(X, y), 1):
+            np.save(os.path.join(directory, 'train-{}.npy'.format(n_folds - 1)), train)
+            np.save(os.path.join(directory, 'test-{}.npy'.format(n_folds - 1)), test)
+        tasks = [(name, fold) for name in classifiers for fold in range(n_folds)]
+        futures = [pool.submit(_score_fold, classifiers[name], fold, scoring) for name, fold in tasks]
+        scores = [future.result() for future in futures]
+    return pd.DataFrame({'Algorithm': [name for name, _ in tasks], 'fold': [fold for _, fold in tasks],
+                         'score': scores})
+
+
+def cv_scores(classifiers, X, y, cv=None, scoring='roc_auc', n_jobs=-1):
+    """10-fold cross validation of each classifier, as in the notebook's CV cell.
+
+    ``X`` may be dense or sparse; all folds of all classifiers run through
+    ``fold_scores``. Returns a frame with the mean and standard deviation of
+    the score per algorithm.
+    """
+    scores = fold_scores(classifiers, X, y, cv, scoring, n_jobs).groupby('Algorithm', sort=False)['score']
+    return pd.DataFrame({'CV_score': scores.mean().to_numpy(), 'CV_stddev': scores.std(ddof=0).to_numpy(),
+                         'Algorithm': list(scores.groups)})
+
+
+def matrix_nbytes(X):
+    """Memory held by a dense or sparse design matrix, or a frame, in bytes."""
+    if hasattr(X, 'data') and hasattr(X, 'indices'):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    if isinstance(X, pd.DataFrame):
+        #Without converting, which would copy mixed dtypes into one upcast array
+        return int(X.memory_usage(index=False).sum())
+    return int(np.asarray(X).nbytes)
@@ -0,0 +1,171 @@
+"""EDA plots rendered from the aggregate cube.
+
+These replace the ``sns.barplot``/``sns.countplot``/``FacetGrid`` cells of
+the notebook. Each helper takes the cube from ``aggregate.build_cube``, so
+drawing a chart costs a few dozen rows instead of a pass over the data, and
+error bars come from closed-form binomial intervals rather than seaborn's
+1000-resample bootstrap.
+"""
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from census.aggregate import ALL, rates
+from census.schema import TARGET
+
+
+def _order(values):
+    try:
+        return sorted(values)
+    except TypeError:
+        return sorted(values, key=str)
+
+
+def rate_barplot(cube, column, hue=True, orient='h', ax=None, level=0.95, ci='wilson', **kwargs):
+    """Bar chart of the ``Income>50k`` rate per value, with error bars.
+
+    Same chart as ``sns.barplot(y=column, x='Income>50k', hue='Year')``. The
+    error bars use the closed-form interval named by ``ci`` (see
+    ``aggregate.proportion_ci``); pass ``ci='bootstrap'`` to resample instead.
+    """
+    ax = ax or plt.gca()
+    table = rates(cube, column, by=hue, level=level, method=ci, **kwargs)
+    values = _order(table['value'].unique())
+    groups = _order(table['by'].unique()) if hue else [None]
+    pos = np.arange(len(values))
+    width = 0.8 / len(groups)
+    bar = ax.barh if orient == 'h' else ax.bar
+    for i, group in enumerate(groups):
+        sub = table if group is None else table[table['by'] == group]
+        sub = sub.set_index('value').reindex(values)
+        err = np.vstack([sub['rate'] - sub['ci_low'], sub['ci_high'] - sub['rate']])
+        offset = pos - 0.4 + width * (i + 0.5)
+        kwargs = {'xerr': err} if orient == 'h' else {'yerr': err}
+        bar(offset, sub['rate'], width, label=None if group in (None, ALL) else str(group), **kwargs)
+    ticks = ax.set_yticks if orient == 'h' else ax.set_xticks
+    ticks(pos)
+    (ax.set_yticklabels if orient == 'h' else ax.set_xticklabels)([str(v) for v in values])
+    (ax.set_xlabel if orient == 'h' else ax.set_ylabel)(TARGET)
+    (ax.set_ylabel if orient == 'h' else ax.set_xlabel)(column)
+    if hue and len(groups) > 1:
+        ax.legend()
+    ax.grid(True)
+    return ax
+
+
+def count_barplot(cube, column, ax=None, rotation=90):
+    """Number of rows per value of ``column``, the distribution of the column."""
+    ax = ax or plt.gca()
+    table = rates(cube, column, by=False)
+    values = _order(table['value'].unique())
+    table = table.set_index('value').reindex(values)
+    ax.bar(range(len(values)), table['count'])
+    ax.set_xticks(range(len(values)))
+    ax.set_xticklabels([str(v) for v in values], rotation=rotation)
+    ax.set_xlabel(column)
+    ax.set_ylabel('count')
+    ax.grid(True)
+    return ax
+
+
+def positive_countplot(cube, column, ax=None):
+    """Count of ``Income>50k`` rows per value of ``column``.
+
+    Same information as ``sns.countplot(hue=column, data=df[df['Income>50k']==1])``.
+    """
+    ax = ax or plt.gca()
+    table = rates(cube, column, by=False).sort_values('positives')
+    ax.barh([str(v) for v in table['value']], table['positives'])
+    ax.set_xlabel('count ({} = 1)'.format(TARGET))
+    ax.set_ylabel(column)
+    ax.grid(True)
+    return ax
+
+
+def facet_countplot(cube, column, rotation=90):
+    """Grid of counts with ``Income>50k`` across columns and ``Year`` down rows.
+
+    Same layout as ``FacetGrid(col='Income>50k', row='Year').map(sns.countplot, column)``.
+    """
+    table = rates(cube, column, by=True)
+    values = _order(table['value'].unique())
+    groups = _order(table['by'].unique())
+    fig, axes = plt.subplots(len(groups), 2, figsize=(12, 6 * len(groups)), squeeze=False, sharey=True)
+    for row, group in enumerate(groups):
+        sub = table[table['by'] == group].set_index('value').reindex(values).fillna(0)
+        for target, counts in enumerate([sub['count'] - sub['positives'], sub['positives']]):
+            ax = axes[row, target]
+            ax.bar(range(len(values)), counts)
+            ax.set_xticks(range(len(values)))
+            ax.set_xticklabels([str(v) for v in values], rotation=rotation)
+            title = '{} = {}'.format(TARGET, target)
+            ax.set_title(title if group == ALL else 'Year = {} | {}'.format(group, title))
+    fig.tight_layout()
+    return fig
+
+
+def sample_points(values, max_points=2000, outlier_share=0.2, random_state=0):
+    """Pick at most ``max_points`` indices of ``values`` to draw, keeping outliers.
+
+    Points outside the boxplot whiskers (1.5 IQR beyond the quartiles) are
+    the interesting ones for the capital gains/losses/dividends columns, so
+    they are kept first. If they exceed ``outlier_share`` of the budget they
+    are thinned evenly by rank, which keeps the extremes. The rest of the
+    budget is a seeded random sample of the inliers, so the same data always
+    gives the same picture.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= max_points:
+        return np.arange(len(values))
+    q1, q3 = np.percentile(values, [25, 75])
+    iqr = q3 - q1
+    outlier = (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+    outliers = np.flatnonzero(outlier)
+    inliers = np.flatnonzero(~outlier)
+    budget = int(max_points * outlier_share)
+    if len(outliers) > budget:
+        ranked = outliers[np.argsort(values[outliers], kind='stable')]
+        outliers = ranked[np.linspace(0, len(ranked) - 1, budget).round().astype(int)]
+    rng = np.random.default_rng(random_state)
+    rest = rng.choice(inliers, size=min(len(inliers), max_points - len(outliers)), replace=False)
+    return np.sort(np.concatenate([outliers, rest]))
+
+
+def _swarm_offsets(values, bins, width):
+    """Spread points sideways within value bins, alternating left and right."""
+    if len(values) == 0:
+        return np.zeros(0)
+    low, high = values.min(), values.max()
+    span = (high - low) or 1.0
+    bin_ids = np.minimum(((values - low) / span * bins).astype(int), bins - 1)
+    order = np.argsort(bin_ids, kind='stable')
+    sorted_ids = bin_ids[order]
+    starts = np.searchsorted(sorted_ids, sorted_ids, side='left')
+    rank = np.empty(len(values), dtype=np.int64)
+    rank[order] = np.arange(len(values)) - starts
+    step = width / max(np.bincount(bin_ids).max(), 1)
+    return np.where(rank % 2, -1, 1) * ((rank + 1) // 2) * step
+
+
+def binned_swarmplot(data, y, x=TARGET, max_points=2000, bins=100, ax=None, random_state=0, s=6, **kwargs):
+    """Scalable stand-in for ``sns.swarmplot(y=y, x=x, data=data)``.
+
+    Each ``x`` group is capped at ``max_points`` with ``sample_points``, and
+    points are spread within ``bins`` value bins instead of by collision
+    avoidance, so drawing is linear in the number of points. A box per
+    group shows the quartiles of all rows, not just the drawn ones.
+    """
+    ax = ax or plt.gca()
+    groups = _order(data[x].dropna().unique())
+    for pos, group in enumerate(groups):
+        values = data.loc[data[x] == group, y].dropna().to_numpy(dtype=np.float64)
+        drawn = values[sample_points(values, max_points, random_state=random_state)]
+        offsets = _swarm_offsets(drawn, bins, 0.4)
+        ax.scatter(pos + offsets, drawn, s=s, **kwargs)
+        ax.boxplot([values], positions=[pos], widths=0.9, showfliers=False, manage_ticks=False,
+                   medianprops={'color': 'black'}, boxprops={'alpha': 0.5})
+    ax.set_xticks(range(len(groups)))
+    ax.set_xticklabels([str(g) for g in groups])
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    return ax
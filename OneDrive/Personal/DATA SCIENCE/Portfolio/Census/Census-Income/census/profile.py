@@ -0,0 +1,122 @@
+"""One-pass column profiler.
+
+Replaces the ``unique()``, ``describe()``, ``value_counts()`` and
+``value_counts(normalize=True)`` cells with a single profile per column:
+null count, cardinality, top values with their frequencies, min/max/mean
+and quartiles for numbers, and the ``Income>50k`` rate per value.
+Categorical columns need one ``bincount`` over their codes; numeric columns
+one sort. Columns are profiled in parallel threads, and the result is cached
+on disk keyed by a hash of the frame.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from census.data import CACHE_DIR, frame_hash
+from census.schema import TARGET
+
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+def _value_stats(values, counts, positives, top):
+    """Top-k frequencies and per-value rates from per-value counts."""
+    total = counts.sum()
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0]
+    stats = {
+        'cardinality': int(len(order)),
+        'top': [[_scalar(values[i]), int(counts[i]), float(counts[i] / total)] for i in order[:top]],
+    }
+    if positives is not None:
+        stats['rate'] = {str(_scalar(values[i])): float(positives[i] / counts[i]) for i in order}
+    return stats
+
+
+def _scalar(x):
+    return x.item() if isinstance(x, np.generic) else x
+
+
+def profile_column(s, y=None, top=10, max_levels=64):
+    """Profile one Series. ``y`` is the 0/1 target aligned with ``s``, if any."""
+    out = {'dtype': str(s.dtype), 'rows': int(len(s))}
+    weights = None if y is None else y.astype(np.float64)
+    if isinstance(s.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(s.dtype):
+        if not isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype('category')
+        codes = s.cat.codes.to_numpy().astype(np.int64) + 1
+        size = len(s.cat.categories) + 1
+        counts = np.bincount(codes, minlength=size)
+        positives = None if weights is None else np.bincount(codes, weights=weights, minlength=size)[1:]
+        out['nulls'] = int(counts[0])
+        out.update(_value_stats(np.asarray(s.cat.categories, dtype=object), counts[1:], positives, top))
+        return out
+    values = s.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(values)
+    out['nulls'] = int(len(values) - valid.sum())
+    order = np.argsort(values[valid], kind='stable')
+    ordered = values[valid][order]
+    if len(ordered) == 0:
+        out['cardinality'] = 0
+        return out
+    #Everything numeric comes from the one sort
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    uniques = ordered[starts]
+    if pd.api.types.is_integer_dtype(s.dtype):
+        uniques = uniques.astype(np.int64)
+    counts = np.diff(np.r_[starts, len(ordered)])
+    out.update({
+        'min': float(ordered[0]),
+        'max': float(ordered[-1]),
+        'mean': float(ordered.mean()),
+        'std': float(ordered.std(ddof=1)) if len(ordered) > 1 else 0.0,
+        'quantiles': {str(q): float(np.quantile(ordered, q)) for q in QUANTILES},
+    })
+    positives = None
+    if weights is not None and len(uniques) <= max_levels:
+        inverse = np.repeat(np.arange(len(uniques)), counts)
+        positives = np.bincount(inverse, weights=weights[valid][order], minlength=len(uniques))
+    out.update(_value_stats(uniques, counts, positives, top))
+    return out
+
+
+def profile(df, target=TARGET, top=10, jobs=None, cache=True, cache_dir=None):
+    """Profile every column of ``df`` in one pass each, in parallel.
+
+    Returns a dict of column name to profile. With ``cache=True`` the result
+    is stored as JSON under the cache directory, keyed by ``frame_hash(df)``
+    and the options, and reused when the same frame is profiled again.
+    """
+    path = None
+    if cache:
+        key = '{}-{}-{}'.format(frame_hash(df)[:16], target, top)
+        path = os.path.join(cache_dir or CACHE_DIR, 'profile-{}.json'.format(key))
+        if os.path.isfile(path):
+            with open(path) as f:
+                return json.load(f)
+    y = df[target].to_numpy() if target in df else None
+    columns = list(df.columns)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(lambda c: profile_column(df[c], None if c == target else y, top), columns)
+        result = dict(zip(columns, results))
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(result, f)
+    return result
+
+
+def summary(result):
+    """Flatten a profile into one row per column, like ``describe()`` plus null counts."""
+    rows = {}
+    for col, p in result.items():
+        row = {k: p.get(k) for k in ['dtype', 'rows', 'nulls', 'cardinality', 'min', 'max', 'mean', 'std']}
+        for q, v in p.get('quantiles', {}).items():
+            row['q' + q] = v
+        if p.get('top'):
+            row['top'], row['top_count'] = p['top'][0][0], p['top'][0][1]
+        rows[col] = row
+    return pd.DataFrame.from_dict(rows, orient='index')
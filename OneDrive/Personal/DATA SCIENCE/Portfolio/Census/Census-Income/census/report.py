@@ -0,0 +1,136 @@
+"""Headless EDA report: the per-column figure set written to disk.
+
+For every column this renders the distribution, the ``Income>50k`` rate by
+value, the ``Income>50k`` x ``Year`` count grid and the positive-class
+breakdown. The data is reduced to the aggregate cube once in the parent
+process; the figures are then drawn across a process pool, each worker
+receiving only its column's slice of the cube. An ``index.html`` links
+every figure. The workers and the command line switch to the Agg backend;
+importing this module leaves the backend alone, so it is safe to use from
+the notebook.
+
+Usage::
+
+    python -m census.report [Data/census-income.data] [--out DIR] --jobs 8
+
+The report goes to ``REPORT_DIR``, next to the package, by default.
+"""
+
+import argparse
+import html
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+from census.aggregate import bin_numeric, build_cube
+from census.cleaning import replace_sentinels
+from census.data import DATA_DIR, read_census
+from census.plots import count_barplot, facet_countplot, positive_countplot, rate_barplot
+from census.schema import NEGATIVE_INCOME, TARGET, WEIGHT_COLUMNS
+
+FIGURES = ['distribution', 'rate', 'facets', 'positives']
+
+REPORT_DIR = os.path.join(os.path.dirname(DATA_DIR), 'report')
+
+
+def _use_agg():
+    matplotlib.use('Agg')
+
+
+def eda_frame(path):
+    """Read a census file into the state the EDA section works on.
+
+    Sentinels are replaced and the ``Income>50k`` label is derived, but no
+    column is dropped or recoded yet. Also returns the null counts.
+    """
+    df, nulls = replace_sentinels(read_census(path, drop=WEIGHT_COLUMNS))
+    df[TARGET] = (df['Income'] != NEGATIVE_INCOME).astype('int8')
+    return df.drop(columns='Income'), nulls
+
+
+def render_column(column, cube, out, formats=('png',)):
+    """Draw the figure set of one column and return the written file names."""
+    n = cube['value'].nunique()
+    height = max(6, 0.3 * n)
+    draw = {
+        'distribution': lambda: count_barplot(cube, column, ax=plt.figure(figsize=(12, 6)).gca()),
+        'rate': lambda: rate_barplot(cube, column, hue=cube['by'].nunique() > 1,
+                                     ax=plt.figure(figsize=(12, height)).gca()),
+        'facets': lambda: facet_countplot(cube, column),
+        'positives': lambda: positive_countplot(cube, column, ax=plt.figure(figsize=(12, height)).gca()),
+    }
+    written = []
+    for kind in FIGURES:
+        draw[kind]()
+        fig = plt.gcf()
+        fig.suptitle(column)
+        for fmt in formats:
+            name = '{}-{}.{}'.format(column, kind, fmt)
+            fig.savefig(os.path.join(out, name), bbox_inches='tight')
+            written.append(name)
+        plt.close(fig)
+    return written
+
+
+def write_index(out, figures, nulls=None):
+    """Write ``index.html`` linking the figures of every column.
+
+    Each figure is shown once, as its PNG when there is one, with links to
+    the files in every other format below it.
+    """
+    lines = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8"><title>Census-Income EDA</title></head><body>',
+             '<h1>Census-Income EDA</h1>']
+    for column, names in figures.items():
+        lines.append('<h2 id="{0}">{0}</h2>'.format(html.escape(column)))
+        if nulls is not None and column in nulls:
+            lines.append('<p>Missing values: {}</p>'.format(int(nulls[column])))
+        variants = {}
+        for name in names:
+            variants.setdefault(os.path.splitext(name)[0], []).append(name)
+        for files in variants.values():
+            shown = next((name for name in files if name.endswith('.png')), files[0])
+            lines.append('<img src="{0}" alt="{0}" style="max-width:100%">'.format(html.escape(shown)))
+            others = ['<a href="{}">{}</a>'.format(html.escape(name), html.escape(os.path.splitext(name)[1][1:]))
+                      for name in files if name != shown]
+            if others:
+                lines.append('<p>Also as: {}</p>'.format(', '.join(others)))
+    lines.append('</body></html>')
+    path = os.path.join(out, 'index.html')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+    return path
+
+
+def build_report(path, out=REPORT_DIR, jobs=None, formats=('png',), bins=10):
+    """Render the full EDA figure set for ``path`` into ``out``.
+
+    ``jobs`` is the number of worker processes, all cores by default.
+    Returns the path of the HTML index.
+    """
+    os.makedirs(out, exist_ok=True)
+    df, nulls = eda_frame(path)
+    cube = build_cube(bin_numeric(df, bins=bins))
+    columns = list(dict.fromkeys(cube['column']))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_use_agg) as pool:
+        futures = {col: pool.submit(render_column, col, cube[cube['column'] == col], out, tuple(formats))
+                   for col in columns}
+        figures = {col: future.result() for col, future in futures.items()}
+    return write_index(out, figures, nulls)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render the Census-Income EDA report.')
+    parser.add_argument('data', nargs='?', default=os.path.join(DATA_DIR, 'census-income.data'))
+    parser.add_argument('--out', default=REPORT_DIR, help='output directory, Census-Income/report by default')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes, all cores by default')
+    parser.add_argument('--formats', nargs='+', default=['png'], choices=['png', 'svg'])
+    parser.add_argument('--bins', type=int, default=10, help='bins for the numeric columns')
+    args = parser.parse_args(argv)
+    _use_agg()
+    print(build_report(args.data, args.out, args.jobs, args.formats, args.bins))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Declarative description of the census-income columns.
+
+The column names follow the attribute mapping at the top of
+``Census-Income.py``. The drop lists record the decisions made during the
+cleaning and EDA sections, so the loader can prune those columns at parse
+time instead of reading them and dropping them afterwards.
+"""
+
+from collections import namedtuple
+
+COLUMNS = ['Age', 'ClassOfWorker', 'IndustryCode', 'OccupationCode', 'Education', 'WagePerHour', 'EnrolledEducation',
+           'MaritalStatus', 'MajorIndustryCode', 'MajorOccupationCode', 'Race', 'HispanicOrigin', 'Sex', 'LabourUnion',
+           'ReasonUnemployed', 'FullOrPartTime', 'CapitalGains', 'CapitalLosses', 'StockDividends', 'TaxFilerStat',
+           'PrevResidenceRegion', 'PrevResidenceState', 'HouseholdFamilyStatus', 'HouseholdSummary', 'InstanceWeight',
+           'MigrationCodeChangeMSA', 'MigrationCodeChangeReg', 'MigrationCodeMoveWithinRegion', 'LiveInHouse1Y',
+           'MigPrevResidenceSunbelt', 'NumPersonsWorkedEmployer', 'FamilyMembersU18', 'CountryBirthFather',
+           'CountryBirthMother', 'CountryBirthSelf', 'Citizenship', 'OwnBusiness', 'QuestionnaireVeteran',
+           'VeteranBenefits', 'WeeksWorkedInY', 'Year', 'Income']
+
+#Dtypes applied by the reader. Nominal fields become categoricals, so later
+#value_counts/groupby calls work on integer codes instead of Python strings.
+#Integer widths follow the ranges listed in census-income.names.
+NUMERIC_DTYPES = {
+    'Age': 'int8',
+    'IndustryCode': 'int8',
+    'OccupationCode': 'int8',
+    'WagePerHour': 'int16',
+    'CapitalGains': 'int32',
+    'CapitalLosses': 'int32',
+    'StockDividends': 'int32',
+    'InstanceWeight': 'float32',
+    'NumPersonsWorkedEmployer': 'int8',
+    'OwnBusiness': 'int8',
+    'VeteranBenefits': 'int8',
+    'WeeksWorkedInY': 'int8',
+    'Year': 'int8',
+}
+
+NOMINAL_COLUMNS = [c for c in COLUMNS if c not in NUMERIC_DTYPES]
+
+DTYPES = dict(NUMERIC_DTYPES, **{c: 'category' for c in NOMINAL_COLUMNS})
+
+#Some missing data is represented as '?', others are 'Not in universe'.
+#Maps each column to the values that mean "missing" in it.
+MISSING_SENTINELS = ('?', 'Not in universe')
+SENTINELS = {c: MISSING_SENTINELS for c in NOMINAL_COLUMNS}
+
+#Binary label derived from Income
+TARGET = 'Income>50k'
+NEGATIVE_INCOME = '- 50000.'
+
+#ClassOfWorker and MajorOccupationCode are missing for those who do not work
+NA_FILL_COLUMNS = ['ClassOfWorker', 'MajorOccupationCode']
+
+#A recode maps listed values through ``mapping``. Unlisted values become
+#``other``, or are kept as they are when ``other`` is None.
+Recode = namedtuple('Recode', ['mapping', 'other'])
+Recode.__new__.__defaults__ = (None,)
+
+#Recodes decided in the EDA section, applied once per distinct value
+RECODES = {
+    #Rename Never Worked and Without Pay to NA, join State and Local Govt
+    'ClassOfWorker': Recode({'Never worked': 'NA', 'Without pay': 'NA',
+                             'Local government': 'Non Federal Government',
+                             'State government': 'Non Federal Government'}),
+    #Keep the main degrees, count 'Some college' as high school and group the rest as 'Other'
+    'Education': Recode({'High school graduate': 'High school graduate',
+                         'Some college but no degree': 'High school graduate',
+                         'Bachelors degree(BA AB BS)': 'Bachelors degree(BA AB BS)',
+                         'Masters degree(MA MS MEng MEd MSW MBA)': 'Masters degree(MA MS MEng MEd MSW MBA)',
+                         'Prof school degree (MD DDS DVM LLB JD)': 'Prof school degree (MD DDS DVM LLB JD)',
+                         'Doctorate degree(PhD EdD)': 'Doctorate degree(PhD EdD)'}, other='Other'),
+    'MaritalStatus': Recode({'Divorced': 'Divorced', 'Separated': 'Divorced',
+                             'Married-civilian spouse present': 'Married', 'Married-spouse absent': 'Married',
+                             'Married-A F spouse present': 'Married'}),
+    'Race': Recode({'Amer Indian Aleut or Eskimo': 'Other'}),
+    'HispanicOrigin': Recode({'All other': 'NA'}),
+    'Sex': Recode({'Male': 1}, other=0),
+    'TaxFilerStat': Recode({'Head of household': 'Other', 'Joint both 65+': 'Other',
+                            'Joint one under 65 & one 65+': 'Other'}),
+    'HouseholdFamilyStatus': Recode({'Householder': 'Householder', 'Spouse of householder': 'Spouse of householder',
+                                     'Nonfamily householder': 'Nonfamily householder'}, other='Other'),
+    #1 = US Citizen, 0 = Non-US Citizen
+    'Citizenship': Recode({'Foreign born- Not a citizen of U S': 0}, other=1),
+    'OwnBusiness': Recode({0: 0}, other=1),
+}
+
+#Higher values do not seem to be correct
+CAPS = {'WagePerHour': 2000}
+
+RENAMES = {'Sex': 'Male'}
+
+#Categorical columns one-hot encoded for modeling
+ONE_HOT_COLUMNS = ['ClassOfWorker', 'Education', 'MaritalStatus', 'MajorIndustryCode', 'MajorOccupationCode', 'Race',
+                   'TaxFilerStat', 'HouseholdFamilyStatus', 'HouseholdSummary']
+
+#Sampling weight, must not be used by the classifiers
+WEIGHT_COLUMNS = ['InstanceWeight']
+
+#Columns with almost completely missing values
+MISSING_COLUMNS = ['EnrolledEducation', 'LabourUnion', 'ReasonUnemployed', 'PrevResidenceRegion', 'PrevResidenceState',
+                   'MigPrevResidenceSunbelt', 'QuestionnaireVeteran', 'FamilyMembersU18', 'MigrationCodeChangeMSA',
+                   'MigrationCodeChangeReg', 'MigrationCodeMoveWithinRegion']
+
+#Rows missing any of these are dropped before the columns themselves are
+COUNTRY_COLUMNS = ['CountryBirthFather', 'CountryBirthMother', 'CountryBirthSelf']
+
+#Columns the EDA decided not to model on
+EXCLUDED_COLUMNS = ['IndustryCode', 'OccupationCode', 'HispanicOrigin', 'FullOrPartTime', 'LiveInHouse1Y'] + \
+    COUNTRY_COLUMNS + ['VeteranBenefits', 'Year']
+
+DROP_COLUMNS = WEIGHT_COLUMNS + MISSING_COLUMNS + EXCLUDED_COLUMNS
+
+#What the modeling pipeline has to parse: everything it keeps, plus the
+#CountryBirth columns that the row filter still needs
+PARSE_DROP_COLUMNS = [c for c in DROP_COLUMNS if c not in COUNTRY_COLUMNS]
+
+
+def usecols(drop=()):
+    """Return the columns left after removing ``drop``, in file order."""
+    unknown = set(drop) - set(COLUMNS)
+    if unknown:
+        raise ValueError('Unknown columns: {}'.format(sorted(unknown)))
+    return [c for c in COLUMNS if c not in drop]
+
+
+def dtypes(columns=COLUMNS):
+    """Return the reader dtypes for ``columns``."""
+    return {c: DTYPES[c] for c in columns}
@@ -0,0 +1,315 @@
+"""Feature selection for the MODELING section.
+
+The notebook fits a single-threaded 300-tree random forest on the whole
+scaled matrix only to read ``feature_importances_`` through
+``SelectFromModel`` (threshold: the mean importance), and does it again
+after SMOTE. ``select_features`` gives that step cheaper backends:
+
+* ``'forest'`` - the notebook's forest, built on all cores;
+* ``'early-forest'`` - a forest grown in batches of trees on subsamples,
+  stopping once the selected set and the importance ranking are stable;
+* ``'hgb'`` - split-gain importances of histogram gradient boosting, which
+  bins the features once and is much faster on the wide one-hot matrix.
+  The gains come from private sklearn attributes, with permutation
+  importances as the fallback.
+
+Every backend keeps one importance vector per member (tree or boosting
+iteration). The members are split into groups to report how often each
+feature is selected and how much the selected sets agree (``stability``,
+the mean pairwise Jaccard index).
+
+Fitted selections are cached on disk, keyed by the hash of the training
+matrix, the backend parameters and the random seed. The importance and
+support arrays are stored as ``.npy`` files and memory-mapped on load, and
+the fitted model is stored with ``joblib``. Reruns on unchanged data skip
+the forest entirely.
+
+``permutation_select`` is a model-agnostic alternative. Impurity
+importances favor the continuous columns, so it instead measures how much
+a held-out score drops when one input column is shuffled. All dummies of
+an encoded column are shuffled together, for example the whole
+``MajorIndustryCode_*`` block (see ``OneHotEncoder.feature_groups``). The
+permutations run in a ``modeling.matrix_pool`` whose workers memory-map
+the held-out matrix read-only. A column stops being permuted once its confidence
+interval lies clearly on one side of the threshold.
+"""
+
+import hashlib
+import json
+import os
+import warnings
+from collections import namedtuple
+from itertools import combinations
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import sklearn
+from scipy.stats import spearmanr, t as student_t
+from sklearn.base import clone
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.inspection import permutation_importance
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import train_test_split
+
+from census.data import CACHE_DIR, CACHE_VERSION, atomic_directory, matrix_hash
+from census.modeling import _WORKER, matrix_pool
+
+METHODS = ('forest', 'early-forest', 'hgb')
+
+Selection = namedtuple('Selection', ['support', 'importances', 'frequency', 'stability', 'n_members', 'model'])
+
+PermutationSelection = namedtuple('PermutationSelection', ['support', 'groups', 'baseline', 'model'])
+
+
+def threshold_support(importances, threshold='mean'):
+    """The ``SelectFromModel`` mask for ``importances``.
+
+    ``threshold`` is a number, ``'mean'``, ``'median'`` or a scaled form
+    such as ``'1.25*mean'``.
+    """
+    if isinstance(threshold, str):
+        factor, _, reference = threshold.rpartition('*')
+        value = {'mean': np.mean, 'median': np.median}[reference.strip()](importances)
+        threshold = float(factor or 1) * value
+    return importances >= threshold
+
+
+def stability(members, threshold='mean', groups=5):
+    """Selection frequency per feature and mean pairwise Jaccard index.
+
+    ``members`` holds one importance vector per row; its rows are split into
+    ``groups`` consecutive groups, each of which selects features on its own.
+    """
+    supports = np.array([threshold_support(part.mean(axis=0), threshold)
+                         for part in np.array_split(members, min(groups, len(members)))])
+    jaccard = [(a & b).sum() / max((a | b).sum(), 1) for a, b in combinations(supports, 2)]
+    return supports.mean(axis=0), float(np.mean(jaccard)) if jaccard else 1.0
+
+
+def _tree_importances(forest, start=0):
+    return np.array([tree.feature_importances_ for tree in forest.estimators_[start:]])
+
+
+def _forest(X, y, n_estimators=300, n_jobs=-1, random_state=None, **kwargs):
+    model = RandomForestClassifier(n_estimators=n_estimators, n_jobs=n_jobs, random_state=random_state, **kwargs)
+    model.fit(X, y)
+    return model, _tree_importances(model)
+
+
+def _early_forest(X, y, threshold='mean', batch=25, max_estimators=300, max_samples=0.5, patience=2,
+                  min_rank_corr=0.99, n_jobs=-1, random_state=None, **kwargs):
+    """Grow a subsampled forest ``batch`` trees at a time.
+
+    Stops once the selected set has not changed and the Spearman correlation
+    of consecutive importance vectors has stayed above ``min_rank_corr`` for
+    ``patience`` batches.
+    """
+    model = RandomForestClassifier(n_estimators=0, warm_start=True, max_samples=max_samples, n_jobs=n_jobs,
+                                   random_state=random_state, **kwargs)
+    members = np.empty((0, X.shape[1]))
+    previous, calm = None, 0
+    while len(members) < max_estimators:
+        model.set_params(n_estimators=len(members) + batch)
+        model.fit(X, y)
+        members = np.vstack([members, _tree_importances(model, len(members))])
+        importances = members.mean(axis=0)
+        if previous is not None:
+            same = (threshold_support(importances, threshold) == threshold_support(previous, threshold)).all()
+            calm = calm + 1 if same and spearmanr(importances, previous)[0] >= min_rank_corr else 0
+            if calm >= patience:
+                break
+        previous = importances
+    return model, members
+
+
+def _gain_importances(model, n_features):
+    """Split gains per boosting iteration, from sklearn's private predictors.
+
+    ``HistGradientBoostingClassifier`` has no public importances, so this
+    reads ``model._predictors`` and the ``gain``/``is_leaf`` fields of each
+    predictor's node array. These are private and may change in any sklearn
+    release; an AttributeError, KeyError or ValueError here means they did.
+    """
+    members = np.zeros((model.n_iter_, n_features))
+    for i, predictors in enumerate(model._predictors):
+        for predictor in predictors:
+            nodes = predictor.nodes[predictor.nodes['is_leaf'] == 0]
+            np.add.at(members[i], nodes['feature_idx'], nodes['gain'])
+    return members
+
+
+def _hgb(X, y, random_state=None, n_repeats=5, **kwargs):
+    """Histogram gradient boosting with one importance vector per member.
+
+    The members are the boosting iterations, with their split gains read
+    from sklearn's private attributes (see ``_gain_importances``). If those
+    are not available in the installed sklearn, the members are instead
+    ``n_repeats`` rounds of the public ``permutation_importance``, with
+    negative drops counted as 0.
+    """
+    if sp.issparse(X):
+        X = X.toarray()
+    model = HistGradientBoostingClassifier(random_state=random_state, **kwargs).fit(X, y)
+    try:
+        members = _gain_importances(model, X.shape[1])
+    except (AttributeError, KeyError, ValueError) as e:
+        warnings.warn('Split gains of HistGradientBoostingClassifier are not available ({!r}), '
+                      'using permutation importances instead'.format(e))
+        result = permutation_importance(model, X, y, scoring='roc_auc', n_repeats=n_repeats,
+                                        random_state=random_state)
+        members = np.clip(result.importances.T, 0, None)
+    totals = members.sum(axis=1, keepdims=True)
+    return model, members / np.where(totals > 0, totals, 1)
+
+
+def save_selection(selection, directory):
+    """Write a selection as ``.npy`` arrays, ``meta.json`` and a joblib model."""
+    with atomic_directory(directory) as tmp:
+        for name in ('support', 'importances', 'frequency'):
+            np.save(os.path.join(tmp, '{}.npy'.format(name)), getattr(selection, name))
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'stability': selection.stability, 'n_members': selection.n_members}, f)
+        joblib.dump(selection.model, os.path.join(tmp, 'model.joblib'))
+
+
+def load_selection(directory, mmap_mode='r'):
+    """Read a selection written by ``save_selection``, memory-mapping its arrays."""
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    arrays = [np.load(os.path.join(directory, '{}.npy'.format(name)), mmap_mode=mmap_mode)
+              for name in ('support', 'importances', 'frequency')]
+    model = joblib.load(os.path.join(directory, 'model.joblib'), mmap_mode=mmap_mode)
+    return Selection(*arrays, meta['stability'], meta['n_members'], model)
+
+
+def selection_path(X, y, method, threshold, groups, random_state, params, cache_dir=None):
+    """Return the cache directory for a selection, keyed by data, parameters and seed."""
+    params = json.dumps({'method': method, 'threshold': threshold, 'groups': groups, 'random_state': random_state,
+                         'params': params, 'sklearn': sklearn.__version__}, sort_keys=True, default=str)
+    signature = '{}:{}:{}'.format(CACHE_VERSION, matrix_hash(X, y), params)
+    key = hashlib.sha256(signature.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir or CACHE_DIR, 'selection-{}-{}'.format(method, key))
+
+
+def select_features(X, y, method='early-forest', threshold='mean', groups=5, random_state=None,
+                    cache=True, cache_dir=None, **kwargs):
+    """Select the features of the design matrix ``X``.
+
+    ``method`` is one of ``METHODS``; extra keyword arguments go to the
+    backend (forests are built with ``n_jobs=-1`` unless given). ``X`` may be
+    sparse. The support uses the notebook's ``SelectFromModel`` rule, the
+    features whose importance is at least ``threshold``.
+
+    With ``cache=True`` and a fixed ``random_state`` the selection is stored
+    under the cache directory and reused on the next call with the same
+    matrix, target and parameters. Without a seed the fit is not
+    reproducible, so nothing is cached.
+    """
+    backends = {'forest': _forest, 'early-forest': _early_forest, 'hgb': _hgb}
+    if method not in backends:
+        raise ValueError('Unknown method {!r}, expected one of {}'.format(method, METHODS))
+    path = None
+    if cache and random_state is not None:
+        path = selection_path(X, y, method, threshold, groups, random_state,
+                              {k: v for k, v in kwargs.items() if k != 'n_jobs'}, cache_dir)
+        if os.path.isfile(os.path.join(path, 'meta.json')):
+            return load_selection(path)
+    if method == 'early-forest':
+        kwargs['threshold'] = threshold
+    model, members = backends[method](X, y, random_state=random_state, **kwargs)
+    importances = members.mean(axis=0)
+    frequency, jaccard = stability(members, threshold, groups)
+    selection = Selection(threshold_support(importances, threshold), importances, frequency, jaccard, len(members),
+                          model)
+    if path is not None:
+        save_selection(selection, path)
+    return selection
+
+
+def report(selection, feature_names):
+    """The selection as a frame, most important feature first."""
+    return (pd.DataFrame({'importance': selection.importances, 'selected': selection.support,
+                          'frequency': selection.frequency}, index=pd.Index(feature_names, name='feature'))
+            .sort_values('importance', ascending=False))
+
+
+def _permuted_scores(columns, seeds):
+    X, y = _WORKER['X'], _WORKER['y']
+    #The shared matrix stays read-only; each worker permutes its own copy
+    if 'buffer' not in _WORKER:
+        _WORKER['buffer'] = np.array(X)
+    buffer, scorer = _WORKER['buffer'], get_scorer(_WORKER['scoring'])
+    scores = []
+    for seed in seeds:
+        order = np.random.default_rng(seed).permutation(len(X))
+        buffer[:, columns] = X[:, columns][order]
+        scores.append(scorer(_WORKER['model'], buffer, y))
+    buffer[:, columns] = X[:, columns]
+    return scores
+
+
+def _interval(drops, level):
+    n = len(drops)
+    mean = np.mean(drops)
+    if n < 2:
+        return mean, -np.inf, np.inf
+    half = student_t.ppf(0.5 + level / 2, n - 1) * np.std(drops, ddof=1) / np.sqrt(n)
+    return mean, mean - half, mean + half
+
+
+def permutation_select(X, y, groups, estimator=None, prefit=False, holdout=0.25, scoring='roc_auc', threshold=0.0,
+                       min_repeats=5, max_repeats=30, step=5, level=0.95, jobs=None, random_state=0):
+    """Select input columns by grouped permutation importance.
+
+    ``groups`` maps a column name to its feature positions in ``X``, as
+    returned by ``OneHotEncoder.feature_groups``. Unless ``prefit`` is set,
+    ``estimator`` (the notebook's logistic regression by default) is fitted
+    on a stratified split of ``X`` and scored on the ``holdout`` share;
+    with ``prefit`` the whole of ``X`` is the held-out sample.
+
+    Each group is shuffled ``min_repeats`` times, then ``step`` more at a
+    time until the ``level`` confidence interval of its score drop lies
+    above or not above ``threshold``, or ``max_repeats`` is reached.
+    Permutation seeds depend only on ``random_state``, the group and the
+    repeat, so results do not depend on the scheduling. A group is selected
+    when the lower bound of its interval is above ``threshold``.
+
+    Returns the feature support, a frame of the groups (mean drop, interval,
+    repeats, selected) and the baseline score.
+    """
+    if prefit:
+        model, X_hold, y_hold = estimator, X, y
+    else:
+        X_fit, X_hold, y_fit, y_hold = train_test_split(X, y, test_size=holdout, stratify=y, random_state=random_state)
+        model = clone(estimator if estimator is not None else LogisticRegression(random_state=42)).fit(X_fit, y_fit)
+    X_hold = X_hold.toarray() if sp.issparse(X_hold) else np.asarray(X_hold)
+    baseline = get_scorer(scoring)(model, X_hold, y_hold)
+    names = list(groups)
+    drops = {name: [] for name in names}
+    done = {}
+    with matrix_pool(X_hold, y_hold, max_workers=jobs, model=model, scoring=scoring) as (pool, _):
+        active = names
+        while active:
+            futures = {}
+            for name in active:
+                start = len(drops[name])
+                count = min(min_repeats if start == 0 else step, max_repeats - start)
+                seeds = [(random_state, names.index(name), r) for r in range(start, start + count)]
+                futures[name] = pool.submit(_permuted_scores, groups[name], seeds)
+            for name, future in futures.items():
+                drops[name] += [baseline - score for score in future.result()]
+                mean, low, high = _interval(drops[name], level)
+                if low > threshold or high <= threshold or len(drops[name]) >= max_repeats:
+                    done[name] = (mean, low, high, len(drops[name]))
+            active = [name for name in active if name not in done]
+    table = pd.DataFrame.from_dict(done, orient='index', columns=['importance', 'ci_low', 'ci_high', 'repeats'])
+    table = table.loc[names]
+    table['selected'] = table['ci_low'] > threshold
+    table.index.name = 'column'
+    support = np.zeros(X.shape[1], dtype=bool)
+    for name in table.index[table['selected']]:
+        support[groups[name]] = True
+    return PermutationSelection(support, table.sort_values('importance', ascending=False), baseline, model)
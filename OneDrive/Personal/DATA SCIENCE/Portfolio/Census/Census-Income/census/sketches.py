@@ -0,0 +1,320 @@
+"""Mergeable sketches for profiling data that does not fit in memory.
+
+Each column of a chunk is summarised by small structures that can be merged
+with those of any other chunk:
+
+- ``QuantileSketch``: KLL-style stack of compactors for approximate quantiles.
+- ``DistinctSketch``: HyperLogLog for the number of distinct values.
+- ``HeavyHitters``: mergeable Space-Saving summary of the most frequent
+  values.
+- ``Moments``: exact count, mean, variance, min and max.
+
+Chunks can therefore be sketched in parallel and merged in any order, and
+``ColumnSketch.to_profile`` returns the same layout as ``profile.profile``,
+so the approximate numbers feed the same summaries and plots.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from census.data import load_frame
+from census.profile import QUANTILES, _scalar
+
+
+def _hash(s):
+    """64-bit hash per non-null value, consistent across chunks."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        #Hash each category once and gather by code
+        hashed = pd.util.hash_array(np.asarray(s.cat.categories, dtype=object))
+        codes = s.cat.codes.to_numpy()
+        return hashed[codes[codes >= 0]]
+    values = s.dropna().to_numpy()
+    return pd.util.hash_array(values if values.dtype != object else values.astype(object))
+
+
+def _bit_length(w):
+    n = np.zeros(len(w), dtype=np.int64)
+    w = w.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = w >= np.uint64(1 << shift)
+        n[big] += shift
+        w[big] >>= np.uint64(shift)
+    return n + (w > 0)
+
+
+class QuantileSketch:
+    """KLL-style quantile sketch.
+
+    Items live in levels; an item at level ``h`` stands for ``2**h`` values.
+    When a level holds more than ``k`` items it is sorted and every other
+    item, from a random offset, moves up a level. The rank error stays
+    around ``n / k``.
+    """
+
+    def __init__(self, k=256, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = []
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self._add(0, values)
+        self._compress()
+        return self
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            self._add(level, items)
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _add(self, level, items):
+        while len(self.levels) <= level:
+            self.levels.append(np.empty(0))
+        self.levels[level] = np.concatenate([self.levels[level], items])
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items)
+                #An odd item out stays at this level
+                keep = items[:len(items) % 2]
+                items = items[len(items) % 2:]
+                self.levels[level] = keep
+                self._add(level + 1, items[self.rng.integers(2)::2])
+            level += 1
+
+    def quantiles(self, qs):
+        if not self.n:
+            return [np.nan for _ in qs]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(x), 2.0 ** h) for h, x in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        cum = np.cumsum(weights[order])
+        pos = np.searchsorted(cum, np.asarray(qs) * cum[-1], side='left')
+        return [float(v) for v in items[order][np.minimum(pos, len(items) - 1)]]
+
+
+class DistinctSketch:
+    """HyperLogLog distinct count with ``2**p`` registers (about 1.04/sqrt(2**p) error)."""
+
+    def __init__(self, p=14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update_hashes(self, hashes):
+        if not len(hashes):
+            return self
+        p = np.uint64(self.p)
+        idx = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        rho = (64 - self.p) - _bit_length(rest) + 1
+        np.maximum.at(self.registers, idx, rho.astype(np.uint8))
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int(np.sum(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            #Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class HeavyHitters:
+    """Space-Saving summary of the most frequent values, kept to ``capacity`` entries.
+
+    ``counts`` never undercount, and each overcounts by at most the matching
+    entry of ``errors``. A value missing from the summary occurs at most
+    ``floor`` times, so every value more frequent than that is listed. The
+    exact counts of a chunk become a summary by keeping the ``capacity``
+    largest, and summaries merge as in parallel Space-Saving: a value missing
+    from one side is charged that side's ``floor``, the counts are added and
+    the ``capacity`` largest kept.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+
+    @property
+    def error(self):
+        """Largest amount by which a listed count, or the count of a missing value, may be off."""
+        return max([self.floor, *self.errors.values()])
+
+    def update_counts(self, counts):
+        """Add the exact counts of one chunk."""
+        ranked = sorted(((value, int(count)) for value, count in counts.items()), key=lambda kv: -kv[1])
+        chunk = HeavyHitters(self.capacity)
+        chunk.counts = dict(ranked[:self.capacity])
+        chunk.errors = dict.fromkeys(chunk.counts, 0)
+        chunk.floor = ranked[self.capacity][1] if len(ranked) > self.capacity else 0
+        return self.merge(chunk)
+
+    def merge(self, other):
+        counts, errors = {}, {}
+        for value in [*self.counts, *(v for v in other.counts if v not in self.counts)]:
+            counts[value] = self.counts.get(value, self.floor) + other.counts.get(value, other.floor)
+            errors[value] = self.errors.get(value, self.floor) + other.errors.get(value, other.floor)
+        floor = self.floor + other.floor
+        ranked = sorted(counts.items(), key=lambda kv: -kv[1])
+        if len(ranked) > self.capacity:
+            floor = max(floor, ranked[self.capacity][1])
+            ranked = ranked[:self.capacity]
+        self.counts = dict(ranked)
+        self.errors = {value: errors[value] for value in self.counts}
+        self.floor = floor
+        return self
+
+    def top(self, k):
+        return sorted(self.counts.items(), key=lambda kv: -kv[1])[:k]
+
+
+class Moments:
+    """Exact count, mean, variance, min and max, merged with Chan's update."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        other = Moments()
+        if len(values):
+            other.n, other.mean = len(values), float(values.mean())
+            other.m2 = float(((values - other.mean) ** 2).sum())
+            other.min, other.max = float(values.min()), float(values.max())
+        return self.merge(other)
+
+    def merge(self, other):
+        n = self.n + other.n
+        if not n:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+
+class ColumnSketch:
+    """All the sketches of one column."""
+
+    def __init__(self, dtype, numeric, k=256, p=14, capacity=64, seed=0):
+        self.dtype = dtype
+        self.numeric = numeric
+        self.rows = 0
+        self.nulls = 0
+        self.distinct = DistinctSketch(p)
+        self.frequent = HeavyHitters(capacity)
+        self.moments = Moments() if numeric else None
+        self.quantiles = QuantileSketch(k, seed) if numeric else None
+
+    @classmethod
+    def for_series(cls, s, **kwargs):
+        numeric = pd.api.types.is_numeric_dtype(s.dtype) and not isinstance(s.dtype, pd.CategoricalDtype)
+        return cls(str(s.dtype), numeric, **kwargs)
+
+    def update(self, s):
+        self.rows += len(s)
+        self.distinct.update_hashes(_hash(s))
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes = s.cat.codes.to_numpy()
+            counts = np.bincount(codes + 1, minlength=len(s.cat.categories) + 1)
+            self.nulls += int(counts[0])
+            self.frequent.update_counts({v: c for v, c in zip(s.cat.categories, counts[1:]) if c})
+        else:
+            self.nulls += int(s.isna().sum())
+            self.frequent.update_counts({_scalar(v): c for v, c in s.value_counts().items()})
+        if self.numeric:
+            values = s.to_numpy(dtype=np.float64)
+            self.moments.update(values)
+            self.quantiles.update(values)
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.nulls += other.nulls
+        self.distinct.merge(other.distinct)
+        self.frequent.merge(other.frequent)
+        if self.numeric:
+            self.moments.merge(other.moments)
+            self.quantiles.merge(other.quantiles)
+        return self
+
+    def to_profile(self, top=10):
+        """Approximate profile in the layout of ``profile.profile_column``.
+
+        ``top_error`` bounds how far the ``top`` counts may be off, and
+        ``top_is_approximate`` is False only when they are exact.
+        """
+        out = {'dtype': self.dtype, 'rows': self.rows, 'nulls': self.nulls, 'cardinality': self.distinct.count(),
+               'top': [[v, c, c / self.rows] for v, c in self.frequent.top(top)],
+               'top_error': self.frequent.error, 'top_is_approximate': self.frequent.error > 0}
+        if self.numeric and self.moments.n:
+            out.update({
+                'min': self.moments.min,
+                'max': self.moments.max,
+                'mean': self.moments.mean,
+                'std': float(np.sqrt(self.moments.m2 / (self.moments.n - 1))) if self.moments.n > 1 else 0.0,
+                'quantiles': dict(zip([str(q) for q in QUANTILES], self.quantiles.quantiles(QUANTILES))),
+            })
+        return out
+
+
+def sketch_frame(df, **kwargs):
+    """Sketch every column of ``df``; returns a dict of column to ``ColumnSketch``."""
+    return {col: ColumnSketch.for_series(df[col], **kwargs).update(df[col]) for col in df.columns}
+
+
+def merge(a, b):
+    """Merge two sketch dicts column by column, into ``a``."""
+    for col, sketch in b.items():
+        if col in a:
+            a[col].merge(sketch)
+        else:
+            a[col] = sketch
+    return a
+
+
+def _sketch_part(args):
+    path, kwargs = args
+    return sketch_frame(load_frame(path), **kwargs)
+
+
+def sketch_store(directory, jobs=None, **kwargs):
+    """Sketch every part of a chunked store in parallel and merge the results.
+
+    Each worker loads one part, so memory is bounded by the part size.
+    """
+    parts = [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.startswith('part-')]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return reduce(merge, pool.map(_sketch_part, [(p, kwargs) for p in parts]), {})
+
+
+def to_profiles(sketches, top=10):
+    """Turn merged sketches into a profile dict usable by ``profile.summary``."""
+    return {col: sketch.to_profile(top) for col, sketch in sketches.items()}
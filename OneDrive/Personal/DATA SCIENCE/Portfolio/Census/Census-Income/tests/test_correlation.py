@@ -0,0 +1,40 @@
+"""Checks that chunked correlations match ``np.corrcoef`` on dense and CSR input.
+
+Run from the Census-Income directory with ``python -m pytest tests``.
+"""
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from census.correlation import CorrelationAccumulator, correlation
+
+
+def design(n=5000, seed=0):
+    """A large-offset column, a mostly zero column and a one-hot block, like the census matrix."""
+    rng = np.random.default_rng(seed)
+    offset = 1e6 + rng.normal(size=n)
+    age = rng.integers(0, 90, n).astype(float)
+    #Mostly zero, like capital gains
+    gains = np.where(rng.random(n) < 0.05, rng.integers(1, 100000, n), 0).astype(float)
+    dummies = np.eye(5)[rng.choice(5, n, p=[0.6, 0.2, 0.1, 0.07, 0.03])]
+    return np.column_stack([offset, age, gains, dummies, offset + 0.5 * age])
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+@pytest.mark.parametrize('chunksize', [700, 5000])
+def test_chunked_correlation(sparse, chunksize):
+    X = design()
+    expected = np.corrcoef(X, rowvar=False)
+    got = correlation(sp.csr_matrix(X) if sparse else X, chunksize=chunksize, cache=False)
+    np.testing.assert_allclose(got.to_numpy(), expected, atol=1e-9)
+
+
+def test_merge_matches_single_pass():
+    X = design()
+    merged = CorrelationAccumulator(range(X.shape[1]))
+    for part in np.array_split(X, 3):
+        merged.merge(CorrelationAccumulator(range(X.shape[1])).update(sp.csr_matrix(part)))
+    whole = CorrelationAccumulator(range(X.shape[1])).update(X)
+    np.testing.assert_allclose(merged.corr().to_numpy(), whole.corr().to_numpy(), atol=1e-9)
+    np.testing.assert_allclose(merged.mean, X.mean(axis=0), rtol=1e-12)
@@ -0,0 +1,63 @@
+"""Checks that ``fold_scaler`` models score raw features like the originals score scaled ones.
+
+Run from the Census-Income directory with ``python -m pytest tests``.
+"""
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from census.encoding import SparseScaler
+from census.modeling import fold_scaler
+
+
+def design(n=2000, dtype=np.float32, seed=0):
+    """Integer-valued numeric columns next to a one-hot block, like the encoded census matrix."""
+    rng = np.random.default_rng(seed)
+    numeric = np.column_stack([rng.integers(0, 90, n), rng.integers(0, 52, n), rng.integers(0, 5000, n)])
+    dummies = np.eye(6)[rng.integers(0, 6, n)]
+    X = np.hstack([numeric, dummies]).astype(dtype)
+    logit = 0.05 * (numeric[:, 0] - 45) + 0.1 * (numeric[:, 1] - 26) + dummies[:, 2] - dummies[:, 4]
+    y = (rng.random(n) < 1 / (1 + np.exp(-logit))).astype(int)
+    return X, y
+
+
+MODELS = [lambda: LogisticRegression(max_iter=1000),
+          lambda: DecisionTreeClassifier(random_state=0),
+          lambda: RandomForestClassifier(n_estimators=20, random_state=0)]
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('make_model', MODELS)
+def test_fold_scaler(sparse, dtype, make_model):
+    X, y = design(dtype=dtype)
+    if sparse:
+        X = sp.csr_matrix(X)
+        scaler = SparseScaler(3).fit(X)
+    else:
+        scaler = StandardScaler().fit(X)
+    scaled = scaler.transform(X)
+    model = make_model().fit(scaled, y)
+    folded = fold_scaler(model, scaler, dtype=dtype)
+    expected, got = model.predict_proba(scaled), folded.predict_proba(X)
+    if hasattr(model, 'coef_'):
+        np.testing.assert_allclose(got, expected, atol=1e-5)
+    else:
+        np.testing.assert_array_equal(got, expected)
+    #The original model is left untouched
+    np.testing.assert_array_equal(model.predict_proba(scaled), expected)
+
+
+def test_fold_scaler_selected_features():
+    X, y = design()
+    scaler = StandardScaler().fit(X)
+    features = np.array([0, 1, 4, 5])
+    scaled = scaler.transform(X)[:, features]
+    model = DecisionTreeClassifier(random_state=0).fit(scaled, y)
+    folded = fold_scaler(model, scaler, features=features)
+    np.testing.assert_array_equal(folded.predict_proba(X[:, features]), model.predict_proba(scaled))